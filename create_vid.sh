@@ -2,14 +2,20 @@
 set -euo pipefail
 
 #===============================================================================
-# DYNAMIC FFMPEG VIDEO GENERATOR (Optimized Multi-Pass Version)
+# DYNAMIC FFMPEG VIDEO GENERATOR
 #
 # This script automatically generates a video with sequential text overlays.
-# It uses a multi-pass approach to avoid memory issues with many images.
-# 1. Generates an animated GIF.
-# 2. Creates a separate video segment for each text image.
-# 3. Concatenates all segments into a single video.
-# 4. Adds the GIF overlay, music, and an optional post-roll video in a final pass.
+# 1. Builds the captioned timeline, either:
+#    - single pass: one filter graph that overlays every text image on the
+#      background with its fades, so the video is encoded exactly once; or
+#    - multi pass: a separate video segment per text image, concatenated.
+#      This is the fallback for very long scripts, where one graph with an
+#      input per text image gets too large; or
+#    - frames: the caller renders the timeline itself and streams raw RGB24
+#      frames (line included) on stdin, so nothing is composited here.
+# 2. Adds the growing line animation, music, and an optional post-roll video
+#    in a final pass. The line is drawn inside the filter graph (a color
+#    source cropped by a time expression), so no frames are rendered up front.
 #===============================================================================
 
 # --- Default Configuration ---
@@ -27,6 +33,21 @@ GIF_HEIGHT=5
 GIF_COLOR="yellow"
 GIF_DURATION=2
 GIF_FRAMERATE=50
+FPS=25
+X264_PRESET=""
+X264_CRF=""
+X264_TUNE=""
+GOP_SIZE=""
+ENCODER_THREADS=0
+PIPELINE_MODE="auto"
+SINGLE_PASS_MAX_TEXTS=30
+SEGMENT_JOBS=0
+SEGMENT_THREADS=2
+SEGMENT_CACHE_DIR=""
+SEGMENT_CACHE_MAX_BYTES=1073741824
+FRAME_SIZE=""
+FRAME_COUNT=""
+VFR=0
 
 # --- Usage/Help Function ---
 usage() {
@@ -40,13 +61,34 @@ usage() {
     echo "  -p, --post-script-video <file> Optional video file to append at the end (e.g., outro.mov)"
     echo "  --duration-per-text <secs>   Display duration for each text image (Default: $DURATION_PER_TEXT)"
     echo "  --fade-duration <secs>       Duration of fade effect (Default: $FADE_DURATION)"
-    echo "  --gif-overlay <file>         Filename for the generated GIF (Default: $GIF_OVERLAY)"
-    echo "  --gif-y-offset <px>          GIF vertical offset from bottom (Default: $GIF_Y_OFFSET)"
+    echo "  --gif-overlay <file>         Ignored; the line animation is no longer written to a GIF"
+    echo "  --gif-y-offset <px>          Line vertical offset from bottom (Default: $GIF_Y_OFFSET)"
     echo "  --gif-width <px>             Width of the animated line (Default: $GIF_WIDTH)"
     echo "  --gif-height <px>            Height of the animated line (Default: $GIF_HEIGHT)"
     echo "  --gif-color <color>          Color of the animated line (Default: $GIF_COLOR)"
-    echo "  --gif-duration <secs>        Duration of the GIF animation (Default: $GIF_DURATION)"
-    echo "  --gif-framerate <fps>        Framerate of the GIF (Default: $GIF_FRAMERATE)"
+    echo "  --gif-duration <secs>        Duration of one line animation cycle (Default: $GIF_DURATION)"
+    echo "  --gif-framerate <fps>        Steps per second of the line animation (Default: $GIF_FRAMERATE)"
+    echo "  --fps <n>                    Output frame rate (Default: $FPS)"
+    echo "  --preset <name>              libx264 preset, e.g. ultrafast, medium, slow (Default: libx264's)"
+    echo "  --crf <n>                    libx264 constant rate factor (Default: libx264's)"
+    echo "  --tune <name>                libx264 tune, e.g. stillimage (Default: none)"
+    echo "  --gop <frames>               Maximum keyframe interval (Default: libx264's)"
+    echo "  --threads <n>                Encoder threads of the final pass; 0 lets ffmpeg decide (Default: $ENCODER_THREADS)"
+    echo "  --mode <auto|single|multi|frames>"
+    echo "                               Single-pass or multi-pass pipeline; auto picks single"
+    echo "                               pass up to --single-pass-max-texts images, frames reads"
+    echo "                               the rendered timeline from stdin (Default: $PIPELINE_MODE)"
+    echo "  --single-pass-max-texts <n>  Largest script auto mode renders in a single pass (Default: $SINGLE_PASS_MAX_TEXTS)"
+    echo "  --segment-jobs <n>           Multi-pass segments encoded concurrently; 0 means"
+    echo "                               CPU count / --segment-threads (Default: $SEGMENT_JOBS)"
+    echo "  --segment-threads <n>        Encoder threads per multi-pass segment (Default: $SEGMENT_THREADS)"
+    echo "  --segment-cache-dir <dir>    Reuse multi-pass segments across runs from this directory (Default: off)"
+    echo "  --segment-cache-max-bytes <n> Size budget of the segment cache, least recently used"
+    echo "                               segments are evicted first (Default: $SEGMENT_CACHE_MAX_BYTES)"
+    echo "  --vfr                        Variable frame rate: encode only frames where the picture"
+    echo "                               changes (fades, line steps), holding the rest"
+    echo "  --frame-size <WxH>           Size of the raw RGB24 frames read in frames mode"
+    echo "  --frame-count <n>            Number of raw frames read in frames mode"
     echo "  -h, --help                   Display this help message"
     echo
     exit 1
@@ -69,6 +111,21 @@ while [[ "$#" -gt 0 ]]; do
         --gif-color) GIF_COLOR="$2"; shift ;;
         --gif-duration) GIF_DURATION="$2"; shift ;;
         --gif-framerate) GIF_FRAMERATE="$2"; shift ;;
+        --fps) FPS="$2"; shift ;;
+        --preset) X264_PRESET="$2"; shift ;;
+        --crf) X264_CRF="$2"; shift ;;
+        --tune) X264_TUNE="$2"; shift ;;
+        --gop) GOP_SIZE="$2"; shift ;;
+        --threads) ENCODER_THREADS="$2"; shift ;;
+        --mode) PIPELINE_MODE="$2"; shift ;;
+        --single-pass-max-texts) SINGLE_PASS_MAX_TEXTS="$2"; shift ;;
+        --segment-jobs) SEGMENT_JOBS="$2"; shift ;;
+        --segment-threads) SEGMENT_THREADS="$2"; shift ;;
+        --segment-cache-dir) SEGMENT_CACHE_DIR="$2"; shift ;;
+        --segment-cache-max-bytes) SEGMENT_CACHE_MAX_BYTES="$2"; shift ;;
+        --frame-size) FRAME_SIZE="$2"; shift ;;
+        --frame-count) FRAME_COUNT="$2"; shift ;;
+        --vfr) VFR=1 ;;
         -h|--help) usage ;;
         *) echo "Unknown parameter passed: $1"; usage ;;
     esac
@@ -80,16 +137,7 @@ TEMP_DIR=$(mktemp -d)
 # Ensure cleanup happens on script exit or interruption
 trap 'rm -rf "$TEMP_DIR"' EXIT
 
-# --- 1. Generate the Animated GIF ---
 echo "Checking for dependencies..."
-if command -v magick &> /dev/null; then
-    MAGICK_CMD="magick"
-elif command -v convert &> /dev/null; then
-    MAGICK_CMD="convert"
-else
-    echo "Error: Neither 'magick' nor 'convert' command found. Please install ImageMagick."
-    exit 1
-fi
 if ! command -v awk &> /dev/null; then
     echo "Error: 'awk' command not found. Please install awk."
     exit 1
@@ -99,93 +147,325 @@ if ! command -v ffprobe &> /dev/null; then
     exit 1
 fi
 
+if command -v sha256sum &> /dev/null; then
+    SHA256_CMD="sha256sum"
+else
+    SHA256_CMD="shasum -a 256"
+fi
+sha256_of() {
+    $SHA256_CMD | awk '{print $1}'
+}
 
-echo "Generating animated line GIF..."
-FRAMES_DIR="$TEMP_DIR/frames"
-PALETTE_FILE="$TEMP_DIR/palette.png"
-mkdir -p "$FRAMES_DIR"
-# Use awk for floating point multiplication and round to the nearest integer.
-TOTAL_GIF_FRAMES=$(awk -v d="$GIF_DURATION" -v r="$GIF_FRAMERATE" 'BEGIN {printf "%.0f", d*r}')
+# Keeps the most recently used segments within SEGMENT_CACHE_MAX_BYTES
+evict_segment_cache() {
+    local total=0 size name
+    for name in $(ls -t "$SEGMENT_CACHE_DIR" | grep '\.mp4$'); do
+        size=$(wc -c < "$SEGMENT_CACHE_DIR/$name" 2>/dev/null | tr -d ' ') || continue
+        total=$((total + ${size:-0}))
+        if [ "$total" -gt "$SEGMENT_CACHE_MAX_BYTES" ]; then
+            rm -f "$SEGMENT_CACHE_DIR/$name"
+        fi
+    done
+}
+SEGMENT_CACHE_HITS=0
 
-for i in $(seq 1 $TOTAL_GIF_FRAMES); do
-  current_width=$((i * GIF_WIDTH / TOTAL_GIF_FRAMES))
-  "$MAGICK_CMD" -size ${GIF_WIDTH}x${GIF_HEIGHT} xc:none -fill "$GIF_COLOR" -draw "rectangle 0,0 $current_width,${GIF_HEIGHT}" "$FRAMES_DIR/frame_$(printf "%03d" $i).png"
-done
+# libx264 settings shared by every encode; the final pass also gets the
+# thread cap, multi-pass segments use SEGMENT_THREADS instead
+X264_OPTS=""
+[ -n "$X264_PRESET" ] && X264_OPTS+=" -preset $X264_PRESET"
+[ -n "$X264_CRF" ] && X264_OPTS+=" -crf $X264_CRF"
+[ -n "$X264_TUNE" ] && X264_OPTS+=" -tune $X264_TUNE"
+[ -n "$GOP_SIZE" ] && X264_OPTS+=" -g $GOP_SIZE"
+FINAL_ENCODER_ARGS="-c:v libx264$X264_OPTS"
+if [ "$ENCODER_THREADS" -gt 0 ]; then
+    FINAL_ENCODER_ARGS+=" -threads $ENCODER_THREADS"
+fi
 
-ffmpeg -y -i "$FRAMES_DIR/frame_%03d.png" -vf "palettegen=reserve_transparent=on" -y "$PALETTE_FILE" >/dev/null 2>&1
-ffmpeg -y -framerate "$GIF_FRAMERATE" -i "$FRAMES_DIR/frame_%03d.png" -i "$PALETTE_FILE" -lavfi "[0:v][1:v]paletteuse" -y "$GIF_OVERLAY" >/dev/null 2>&1
-echo "GIF generation complete."
+# --- 1. Line Animation Filter ---
+# The line grows from the left in GIF_FRAMERATE steps per second and restarts
+# every cycle, as the looped GIF used to. Step i of a cycle shows
+# i * GIF_WIDTH / steps + 1 columns. A GIF_WIDTH-wide bar of GIF_COLOR is
+# padded with as much transparency on its right, and a crop window slides
+# across it so that only the current number of columns is visible.
+LINE_STEPS=$(awk -v d="$GIF_DURATION" -v r="$GIF_FRAMERATE" 'BEGIN {s = sprintf("%.0f", d*r); print (s < 1 ? 1 : s)}')
+LINE_PERIOD=$(awk -v s="$LINE_STEPS" -v r="$GIF_FRAMERATE" 'BEGIN {print s/r}')
+LINE_VISIBLE="min(${GIF_WIDTH}\\,floor((floor(mod(t\\,${LINE_PERIOD})*${GIF_FRAMERATE}+0.000001)+1)*${GIF_WIDTH}/${LINE_STEPS})+1)"
+LINE_FILTER="color=c=${GIF_COLOR}:s=${GIF_WIDTH}x${GIF_HEIGHT}:r=${FPS},format=rgba,"
+LINE_FILTER+="pad=w=$((GIF_WIDTH * 2)):h=${GIF_HEIGHT}:x=0:y=0:color=black@0,"
+LINE_FILTER+="crop=w=${GIF_WIDTH}:h=${GIF_HEIGHT}:x=${GIF_WIDTH}-${LINE_VISIBLE}:y=0[line]"
 
-# --- 2. Generate Individual Video Segments ---
-echo "Generating individual video segments..."
-TEXT_IMAGES=($(ls "$TEXT_IMG_DIR"/*.png 2>/dev/null | sort -V))
-NUM_TEXT_IMAGES=${#TEXT_IMAGES[@]}
-if [ "$NUM_TEXT_IMAGES" -eq 0 ]; then
-    echo "Error: No text images found in '$TEXT_IMG_DIR'."
-    exit 1
+# --- 2. Collect Text Images and Choose the Pipeline ---
+if [ "$PIPELINE_MODE" = "frames" ]; then
+    # The frames already contain the texts; nothing is read from TEXT_IMG_DIR
+    if ! [[ "$FRAME_SIZE" =~ ^[0-9]+x[0-9]+$ ]] || ! [[ "$FRAME_COUNT" =~ ^[1-9][0-9]*$ ]]; then
+        echo "Error: --mode frames requires --frame-size WxH and a positive --frame-count."
+        exit 1
+    fi
+    NUM_TEXT_IMAGES=0
+else
+    TEXT_IMAGES=($(ls "$TEXT_IMG_DIR"/*.png 2>/dev/null | sort -V))
+    NUM_TEXT_IMAGES=${#TEXT_IMAGES[@]}
+    if [ "$NUM_TEXT_IMAGES" -eq 0 ]; then
+        echo "Error: No text images found in '$TEXT_IMG_DIR'."
+        exit 1
+    fi
 fi
 
-CONCAT_LIST_FILE="$TEMP_DIR/concat_list.txt"
-for i in $(seq 0 $(($NUM_TEXT_IMAGES - 1))); do
-    text_img_path="${TEXT_IMAGES[$i]}"
-    segment_output_path="$TEMP_DIR/segment_$((i+1)).mp4"
-    echo "Processing $text_img_path -> $segment_output_path"
+case "$PIPELINE_MODE" in
+    single|multi|frames) ;;
+    auto)
+        if [ "$NUM_TEXT_IMAGES" -le "$SINGLE_PASS_MAX_TEXTS" ]; then
+            PIPELINE_MODE="single"
+        else
+            PIPELINE_MODE="multi"
+        fi
+        ;;
+    *) echo "Error: Unknown --mode '$PIPELINE_MODE' (expected auto, single, multi or frames)."; exit 1 ;;
+esac
+if [ "$PIPELINE_MODE" = "frames" ]; then
+    echo "Using frames pipeline for $FRAME_COUNT frames of $FRAME_SIZE from stdin."
+else
+    echo "Using $PIPELINE_MODE-pass pipeline for $NUM_TEXT_IMAGES text images."
+fi
 
-    # Use awk for floating point subtraction.
+# Both pipelines produce MAIN_INPUTS/MAIN_FILTER: the ffmpeg inputs and the
+# filter graph that yield the captioned video with the line animation as
+# [main_v_base], plus MAIN_INPUT_COUNT, MAIN_DURATION, MAIN_WIDTH, MAIN_HEIGHT
+# and MAIN_FPS for the final pass.
+if [ "$PIPELINE_MODE" = "frames" ]; then
+    # --- 3c. Frames: raw video on stdin, already composited and even-sized ---
+    MAIN_INPUTS="-f rawvideo -pix_fmt rgb24 -video_size $FRAME_SIZE -framerate $FPS -i pipe:0"
+    MAIN_INPUT_COUNT=1
+    MAIN_FILTER="[0:v]null[main_v_base]"
+    MAIN_DURATION=$(awk -v n="$FRAME_COUNT" -v r="$FPS" 'BEGIN {print n/r}')
+    MAIN_WIDTH=${FRAME_SIZE%x*}
+    MAIN_HEIGHT=${FRAME_SIZE#*x}
+    MAIN_FPS=$FPS
+elif [ "$PIPELINE_MODE" = "single" ]; then
+    # --- 3a. Single pass: one filter graph over the whole timeline ---
+    # Every image is decoded once and repeated with the loop filter. Timestamps
+    # count frames (time base 1/FPS), so each text is faded on its own clock
+    # and then shifted to its slot on the timeline by a whole number of frames.
+    TEXT_FRAMES=$(awk -v d="$DURATION_PER_TEXT" -v r="$FPS" 'BEGIN {printf "%.0f", d*r}')
+    TOTAL_FRAMES=$((NUM_TEXT_IMAGES * TEXT_FRAMES))
+    MAIN_DURATION=$(awk -v n="$TOTAL_FRAMES" -v r="$FPS" 'BEGIN {print n/r}')
     fade_out_start=$(awk -v d="$DURATION_PER_TEXT" -v f="$FADE_DURATION" 'BEGIN {print d-f}')
 
+    MAIN_INPUTS="-i \"$BACKGROUND_IMG\""
+    MAIN_FILTER="[0:v]format=rgba,loop=loop=-1:size=1,settb=1/${FPS},setpts=N,trim=end_frame=${TOTAL_FRAMES}[bg];"
+    current_label="bg"
+    for i in $(seq 0 $(($NUM_TEXT_IMAGES - 1))); do
+        input_idx=$((i + 1))
+        MAIN_INPUTS+=" -i \"${TEXT_IMAGES[$i]}\""
+        MAIN_FILTER+="[${input_idx}:v]format=rgba,loop=loop=$((TEXT_FRAMES - 1)):size=1,settb=1/${FPS},setpts=N,"
+        MAIN_FILTER+="fade=in:st=0:d=$FADE_DURATION:alpha=1,fade=out:st=$fade_out_start:d=$FADE_DURATION:alpha=1,"
+        MAIN_FILTER+="setpts=PTS+$((i * TEXT_FRAMES))[txt${input_idx}];"
+        MAIN_FILTER+="[${current_label}][txt${input_idx}]overlay=(main_w-overlay_w)/2:(main_h-overlay_h)/2:eof_action=pass[v${input_idx}];"
+        current_label="v${input_idx}"
+    done
+    MAIN_INPUT_COUNT=$((NUM_TEXT_IMAGES + 1))
+    MAIN_FILTER+="[${current_label}]scale=trunc(iw/2)*2:trunc(ih/2)*2[captioned];"
+    MAIN_FILTER+="${LINE_FILTER};[captioned][line]overlay=(main_w-overlay_w)/2:main_h-overlay_h-$GIF_Y_OFFSET:shortest=1[main_v_base]"
+
+    BG_WIDTH=$(ffprobe -v error -select_streams v:0 -show_entries stream=width -of csv=p=0 "$BACKGROUND_IMG")
+    BG_HEIGHT=$(ffprobe -v error -select_streams v:0 -show_entries stream=height -of csv=p=0 "$BACKGROUND_IMG")
+    MAIN_WIDTH=$((BG_WIDTH / 2 * 2))
+    MAIN_HEIGHT=$((BG_HEIGHT / 2 * 2))
+    MAIN_FPS=$FPS
+else
+    # --- 3b. Multi pass: encode one segment per text image, then concatenate ---
+    # Slower, but keeps each ffmpeg process small for very long scripts.
+    # Segments are encoded concurrently, SEGMENT_JOBS at a time with at most
+    # SEGMENT_THREADS encoder threads each. The concat list is written in
+    # script order up front, so completion order does not matter.
+    if [ "$SEGMENT_JOBS" -le 0 ]; then
+        CPU_COUNT=$(getconf _NPROCESSORS_ONLN 2>/dev/null || echo 1)
+        # A thread cap of 0 lets each encoder pick its own thread count
+        SEGMENT_JOBS=$((SEGMENT_THREADS > 0 ? CPU_COUNT / SEGMENT_THREADS : 1))
+        [ "$SEGMENT_JOBS" -ge 1 ] || SEGMENT_JOBS=1
+    fi
+    echo "Generating individual video segments ($SEGMENT_JOBS at a time, $SEGMENT_THREADS threads each)..."
+
+    # Use awk for floating point subtraction.
+    fade_out_start=$(awk -v d="$DURATION_PER_TEXT" -v f="$FADE_DURATION" 'BEGIN {print d-f}')
     # Added scale filter to ensure even dimensions for the encoder.
-    ffmpeg -y -loop 1 -i "$BACKGROUND_IMG" -loop 1 -i "$text_img_path" \
-    -filter_complex "[1:v]format=rgba,fade=in:st=0:d=$FADE_DURATION:alpha=1,fade=out:st=$fade_out_start:d=$FADE_DURATION:alpha=1[txt];[0:v][txt]overlay=(main_w-overlay_w)/2:(main_h-overlay_h)/2,scale=trunc(iw/2)*2:trunc(ih/2)*2" \
-    -t "$DURATION_PER_TEXT" -c:v libx264 -pix_fmt yuv420p -r 25 "$segment_output_path" >/dev/null 2>&1
-    
-    echo "file '$segment_output_path'" >> "$CONCAT_LIST_FILE"
-done
+    SEGMENT_FILTER="[1:v]format=rgba,fade=in:st=0:d=$FADE_DURATION:alpha=1,fade=out:st=$fade_out_start:d=$FADE_DURATION:alpha=1[txt];[0:v][txt]overlay=(main_w-overlay_w)/2:(main_h-overlay_h)/2,scale=trunc(iw/2)*2:trunc(ih/2)*2"
+    SEGMENT_ENCODER_ARGS=(-c:v libx264 $X264_OPTS -pix_fmt yuv420p -r "$FPS")
+
+    # Cache key of a segment: its inputs' bytes plus everything that shapes
+    # the encode (duration, filter graph with the fades, fps, encoder args).
+    # The thread cap is left out on purpose; it does not change the picture.
+    if [ -n "$SEGMENT_CACHE_DIR" ]; then
+        mkdir -p "$SEGMENT_CACHE_DIR"
+        BACKGROUND_HASH=$(sha256_of < "$BACKGROUND_IMG")
+    fi
+    segment_cache_key() {
+        local text_hash
+        text_hash=$(sha256_of < "$1")
+        printf '%s\n' "$BACKGROUND_HASH" "$text_hash" "$DURATION_PER_TEXT" \
+            "$SEGMENT_FILTER" "${SEGMENT_ENCODER_ARGS[*]}" | sha256_of
+    }
 
-# --- 3. Concatenate Segments ---
-echo "Concatenating segments..."
-CONCAT_VIDEO_PATH="$TEMP_DIR/concatenated.mp4"
-ffmpeg -y -f concat -safe 0 -i "$CONCAT_LIST_FILE" -c copy "$CONCAT_VIDEO_PATH" >/dev/null 2>&1
+    # Encodes one segment; on failure leaves a .failed marker next to its log
+    # instead of exiting, so the caller can stop the remaining encodes. With
+    # a cache key, a successful encode is also published to the cache.
+    encode_segment() {
+        local text_img_path="$1"
+        local segment_output_path="$2"
+        local cache_key="$3"
+        if ! ffmpeg -hide_banner -y -loop 1 -framerate "$FPS" -i "$BACKGROUND_IMG" -loop 1 -framerate "$FPS" -i "$text_img_path" \
+            -filter_complex "$SEGMENT_FILTER" \
+            -t "$DURATION_PER_TEXT" "${SEGMENT_ENCODER_ARGS[@]}" -threads "$SEGMENT_THREADS" \
+            "$segment_output_path" >"$segment_output_path.log" 2>&1; then
+            touch "$segment_output_path.failed"
+            return
+        fi
+        if [ -n "$cache_key" ]; then
+            local staged="$SEGMENT_CACHE_DIR/.tmp_${cache_key}_$$_$(basename "$segment_output_path")"
+            if ln "$segment_output_path" "$staged" 2>/dev/null || cp "$segment_output_path" "$staged" 2>/dev/null; then
+                mv -f "$staged" "$SEGMENT_CACHE_DIR/$cache_key.mp4" || rm -f "$staged"
+            fi
+        fi
+    }
 
-# --- 4. Final Pass: Add GIF, Music, and Optional Post-Roll Video ---
+    segment_failures() {
+        ls "$TEMP_DIR"/segment_*.failed 2>/dev/null | wc -l | tr -d ' '
+    }
+
+    CONCAT_LIST_FILE="$TEMP_DIR/concat_list.txt"
+    for i in $(seq 0 $(($NUM_TEXT_IMAGES - 1))); do
+        text_img_path="${TEXT_IMAGES[$i]}"
+        segment_output_path="$TEMP_DIR/segment_$((i+1)).mp4"
+        echo "file '$segment_output_path'" >> "$CONCAT_LIST_FILE"
+
+        cache_key=""
+        if [ -n "$SEGMENT_CACHE_DIR" ]; then
+            cache_key=$(segment_cache_key "$text_img_path")
+            cached_segment="$SEGMENT_CACHE_DIR/$cache_key.mp4"
+            # Link rather than reference the cached file, so a concurrent
+            # eviction cannot remove it before the concat step reads it
+            if ln "$cached_segment" "$segment_output_path" 2>/dev/null || cp "$cached_segment" "$segment_output_path" 2>/dev/null; then
+                touch "$cached_segment" 2>/dev/null || true
+                SEGMENT_CACHE_HITS=$((SEGMENT_CACHE_HITS + 1))
+                echo "Reusing cached segment for $text_img_path"
+                continue
+            fi
+        fi
+
+        # Wait for a free slot; stop launching new encodes once one has failed
+        while [ "$(jobs -rp | wc -l | tr -d ' ')" -ge "$SEGMENT_JOBS" ] && [ "$(segment_failures)" -eq 0 ]; do
+            sleep 0.05
+        done
+        if [ "$(segment_failures)" -ne 0 ]; then
+            break
+        fi
+        echo "Processing $text_img_path -> $segment_output_path"
+        encode_segment "$text_img_path" "$segment_output_path" "$cache_key" &
+    done
+    wait
+    if [ -n "$SEGMENT_CACHE_DIR" ]; then
+        echo "Segment cache: $SEGMENT_CACHE_HITS of $NUM_TEXT_IMAGES segments reused."
+    fi
+
+    if [ "$(segment_failures)" -ne 0 ]; then
+        for failed_marker in "$TEMP_DIR"/segment_*.failed; do
+            failed_segment="${failed_marker%.failed}"
+            echo "Error: Failed to encode $(basename "$failed_segment"). ffmpeg output:" >&2
+            tail -n 20 "$failed_segment.log" >&2
+        done
+        exit 1
+    fi
+
+    if [ -n "$SEGMENT_CACHE_DIR" ]; then
+        evict_segment_cache
+    fi
+
+    echo "Concatenating segments..."
+    CONCAT_VIDEO_PATH="$TEMP_DIR/concatenated.mp4"
+    ffmpeg -y -f concat -safe 0 -i "$CONCAT_LIST_FILE" -c copy "$CONCAT_VIDEO_PATH" >/dev/null 2>&1
+
+    MAIN_INPUTS="-i \"$CONCAT_VIDEO_PATH\""
+    MAIN_INPUT_COUNT=1
+    MAIN_FILTER="${LINE_FILTER};[0:v][line]overlay=(main_w-overlay_w)/2:main_h-overlay_h-$GIF_Y_OFFSET:shortest=1[main_v_base]"
+    MAIN_FPS=$FPS
+
+    if [ -n "$POST_SCRIPT_VIDEO" ]; then
+        MAIN_DURATION=$(ffprobe -v error -show_entries format=duration -of default=noprint_wrappers=1:nokey=1 "$CONCAT_VIDEO_PATH")
+        # Probe main video properties to normalize outro for safe concat
+        MAIN_WIDTH=$(ffprobe -v error -select_streams v:0 -show_entries stream=width -of csv=p=0 "$CONCAT_VIDEO_PATH")
+        MAIN_HEIGHT=$(ffprobe -v error -select_streams v:0 -show_entries stream=height -of csv=p=0 "$CONCAT_VIDEO_PATH")
+        MAIN_FPS_RAW=$(ffprobe -v error -select_streams v:0 -show_entries stream=r_frame_rate -of csv=p=0 "$CONCAT_VIDEO_PATH")
+        # Convert r_frame_rate (e.g., 25/1) to integer fps
+        MAIN_FPS=$(awk -v fps="$MAIN_FPS_RAW" 'BEGIN{split(fps,a,"/"); if (length(a)==2 && a[2] != 0) printf "%.0f", a[1]/a[2]; else if (fps!="") printf "%.0f", fps; else print 25}')
+    fi
+fi
+
+# --- 4. Variable Frame Rate ---
+# Between fades a text is static and the line only moves on its own steps,
+# so with --vfr only frames that can differ from the one before are kept:
+# the first frame of each text, its fade frames, frames where the line takes
+# a step, and one frame per second so no hold gets too long for players.
+# Dropped frames are held by the previous frame's timestamp. The last frame
+# is always kept so the video keeps its exact duration. Keyframes are forced
+# by time, since a GOP counted in frames would stretch over the holds.
+MAIN_V_SELECT=""
+MAIN_RATE_ARGS="-r $MAIN_FPS"
+if [ "$VFR" -eq 1 ]; then
+    TEXT_FRAMES=$(awk -v d="$DURATION_PER_TEXT" -v r="$FPS" 'BEGIN {printf "%.0f", d*r}')
+    if [ "$PIPELINE_MODE" = "frames" ]; then
+        LAST_FRAME=$((FRAME_COUNT - 1))
+    else
+        LAST_FRAME=$((NUM_TEXT_IMAGES * TEXT_FRAMES - 1))
+    fi
+    FADE_IN_FRAMES=$(awk -v f="$FADE_DURATION" -v r="$FPS" 'BEGIN {n = f*r; printf "%d", (n == int(n) ? n : int(n) + 1)}')
+    FADE_OUT_FRAME=$(awk -v d="$DURATION_PER_TEXT" -v f="$FADE_DURATION" -v r="$FPS" 'BEGIN {printf "%d", (d-f)*r}')
+    line_step() {
+        echo "floor(mod(($1)/${FPS}\\,${LINE_PERIOD})*${GIF_FRAMERATE}+0.000001)"
+    }
+    MAIN_V_SELECT="select=eq(n\\,0)+eq(n\\,${LAST_FRAME})+not(mod(n\\,${MAIN_FPS}))"
+    MAIN_V_SELECT+="+lte(mod(n\\,${TEXT_FRAMES})\\,${FADE_IN_FRAMES})+gte(mod(n\\,${TEXT_FRAMES})\\,${FADE_OUT_FRAME})"
+    MAIN_V_SELECT+="+not(eq($(line_step n)\\,$(line_step n-1)))"
+    MAIN_RATE_ARGS="-fps_mode vfr"
+    if [ -n "$GOP_SIZE" ]; then
+        FINAL_ENCODER_ARGS+=" -force_key_frames \"expr:gte(t,n_forced*$(awk -v g="$GOP_SIZE" -v r="$FPS" 'BEGIN {print g/r}'))\""
+    fi
+    echo "Variable frame rate: keeping only changing frames of $((LAST_FRAME + 1))."
+fi
+
+# --- 5. Final Pass: Add Music and Optional Post-Roll Video ---
 echo "Adding final overlays and music..."
 
 if [ -z "$POST_SCRIPT_VIDEO" ]; then
     # --- SIMPLE PATH: No post-roll video ---
-    FINAL_CMD="ffmpeg -y -i \"$CONCAT_VIDEO_PATH\" -stream_loop -1 -i \"$GIF_OVERLAY\""
+    FINAL_CMD="ffmpeg -y $MAIN_INPUTS"
     if [ -n "$MUSIC_FILE" ]; then
         FINAL_CMD+=" -i \"$MUSIC_FILE\""
     fi
-    
-    FILTER_COMPLEX="[0:v][1:v]overlay=(main_w-overlay_w)/2:main_h-overlay_h-$GIF_Y_OFFSET:shortest=1[final_v]"
-    FINAL_CMD+=" -filter_complex \"$FILTER_COMPLEX\" -map \"[final_v]\""
+
+    if [ -n "$MAIN_V_SELECT" ]; then
+        FINAL_CMD+=" -filter_complex \"$MAIN_FILTER;[main_v_base]$MAIN_V_SELECT[main_v]\" -map \"[main_v]\""
+    else
+        FINAL_CMD+=" -filter_complex \"$MAIN_FILTER\" -map \"[main_v_base]\""
+    fi
 
     if [ -n "$MUSIC_FILE" ]; then
-        music_input_index=2
+        music_input_index=$MAIN_INPUT_COUNT
         FINAL_CMD+=" -map ${music_input_index}:a -c:a aac -shortest"
     fi
 
-    FINAL_CMD+=" -c:v libx264 -pix_fmt yuv420p \"$OUTPUT_FILE\""
+    FINAL_CMD+=" $FINAL_ENCODER_ARGS -pix_fmt yuv420p $MAIN_RATE_ARGS \"$OUTPUT_FILE\""
 
 else
     # --- ADVANCED PATH: Post-roll video is present ---
-	MAIN_DURATION=$(ffprobe -v error -show_entries format=duration -of default=noprint_wrappers=1:nokey=1 "$CONCAT_VIDEO_PATH")
 	AUDIO_FADE_START=$(awk -v d="$MAIN_DURATION" -v f="$FADE_DURATION" 'BEGIN {print d-f}')
 
-	# Probe main video properties to normalize outro for safe concat
-	MAIN_WIDTH=$(ffprobe -v error -select_streams v:0 -show_entries stream=width -of csv=p=0 "$CONCAT_VIDEO_PATH")
-	MAIN_HEIGHT=$(ffprobe -v error -select_streams v:0 -show_entries stream=height -of csv=p=0 "$CONCAT_VIDEO_PATH")
-	MAIN_FPS_RAW=$(ffprobe -v error -select_streams v:0 -show_entries stream=r_frame_rate -of csv=p=0 "$CONCAT_VIDEO_PATH")
-	# Convert r_frame_rate (e.g., 25/1) to integer fps
-	MAIN_FPS=$(awk -v fps="$MAIN_FPS_RAW" 'BEGIN{split(fps,a,"/"); if (length(a)==2 && a[2] != 0) printf "%.0f", a[1]/a[2]; else if (fps!="") printf "%.0f", fps; else print 25}')
-
 	# Detect outro audio presence and duration
 	POST_HAS_AUDIO=$(ffprobe -v error -select_streams a:0 -show_entries stream=codec_type -of csv=p=0 "$POST_SCRIPT_VIDEO" | wc -l | tr -d ' ')
 	POST_DURATION=$(ffprobe -v error -show_entries format=duration -of default=noprint_wrappers=1:nokey=1 "$POST_SCRIPT_VIDEO")
 
     # Build inputs dynamically
-    FINAL_CMD="ffmpeg -y -i \"$CONCAT_VIDEO_PATH\" -stream_loop -1 -i \"$GIF_OVERLAY\""
-    INPUT_COUNT=2
+    FINAL_CMD="ffmpeg -y $MAIN_INPUTS"
+    INPUT_COUNT=$MAIN_INPUT_COUNT
     if [ -n "$MUSIC_FILE" ]; then
         FINAL_CMD+=" -i \"$MUSIC_FILE\""
         MUSIC_INPUT_IDX=$INPUT_COUNT
@@ -195,9 +475,9 @@ else
     POST_SCRIPT_INPUT_IDX=$INPUT_COUNT
 
 	# Build filter_complex dynamically
-	# 1) Overlay GIF on main segment, then normalize main video to width/height/fps/pix_fmt
-	FILTER_COMPLEX="[0:v][1:v]overlay=(main_w-overlay_w)/2:main_h-overlay_h-$GIF_Y_OFFSET:shortest=1[main_v_base];"
-	FILTER_COMPLEX+="[main_v_base]fps=${MAIN_FPS},format=yuv420p,scale=${MAIN_WIDTH}:${MAIN_HEIGHT}:flags=bicubic[main_v];"
+	# 1) Take the captioned main video with the line overlay, then normalize it to width/height/fps/pix_fmt
+	FILTER_COMPLEX="$MAIN_FILTER;"
+	FILTER_COMPLEX+="[main_v_base]fps=${MAIN_FPS},${MAIN_V_SELECT:+$MAIN_V_SELECT,}format=yuv420p,scale=${MAIN_WIDTH}:${MAIN_HEIGHT}:flags=bicubic[main_v];"
     
 	# 2) Normalize outro video to match main
 	FILTER_COMPLEX+="[${POST_SCRIPT_INPUT_IDX}:v]scale=${MAIN_WIDTH}:${MAIN_HEIGHT}:force_original_aspect_ratio=decrease:flags=bicubic,pad=${MAIN_WIDTH}:${MAIN_HEIGHT}:(ow-iw)/2:(oh-ih)/2:color=black,fps=${MAIN_FPS},format=yuv420p[post_v];"
@@ -232,7 +512,11 @@ else
 	FILTER_COMPLEX+="${CONCAT_STREAMS}concat=n=2:v=1:a=1[final_v][final_a]"
     
     FINAL_CMD+=" -filter_complex \"$FILTER_COMPLEX\" -map \"[final_v]\" -map \"[final_a]\""
-    FINAL_CMD+=" -c:v libx264 -pix_fmt yuv420p \"$OUTPUT_FILE\""
+    FINAL_CMD+=" $FINAL_ENCODER_ARGS -pix_fmt yuv420p"
+    if [ "$VFR" -eq 1 ]; then
+        FINAL_CMD+=" $MAIN_RATE_ARGS"
+    fi
+    FINAL_CMD+=" \"$OUTPUT_FILE\""
 fi
 
 set +e
@@ -1,14 +1,14 @@
 from fastapi import FastAPI, Query
-from fastapi.responses import StreamingResponse
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
 from pydantic import BaseModel, Field
 from typing import Literal, Set, List, Union, Optional
 from PIL import Image, ImageDraw, ImageFont, ImageEnhance
-import requests
 import io
 import html
 from bs4 import BeautifulSoup
 from bs4.element import NavigableString
 from fastapi.exceptions import HTTPException
+from starlette.background import BackgroundTask
 import logging
 import re
 import base64
@@ -17,25 +17,49 @@ import asyncio
 import sys
 import tempfile
 import subprocess
-from concurrent.futures import ProcessPoolExecutor
+import threading
+import mmap
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import asynccontextmanager, contextmanager
 from typing import Optional
 import shutil
 from dotenv import load_dotenv
 from dropbox.files import WriteMode
 from dropbox.exceptions import ApiError
-from scripts.dropbox_utils import (
-    get_dbx_client,
-    upload_to_dropbox,
-    upload_and_get_temporary_link as upload_and_get_link,
-    ensure_dropbox_folder,
-    upload_bytes,
-)
+from scripts.dropbox_utils import get_dbx_client
+from scripts.image_fetch import ImageFetcher, ImageFetchError
+from scripts.image_cache import ImageCache
+from scripts.asset_cache import DropboxAssetCache
+from scripts.storage import StorageBackend, DropboxStorage, LocalStorage
+from scripts.frame_renderer import CaptionFrameRenderer, TextImage
+from scripts.video_jobs import VideoJobQueue, JobQueueFull, JOB_FAILED, JOB_SUCCEEDED
 import dropbox
 import time
 
 load_dotenv()
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Starts the shared render pool and the video job queue on startup; shuts
+    down the job queue, the shared pools and the image fetcher on exit.
+    """
+    await start_render_pool()
+    start_video_job_queue()
+    try:
+        yield
+    finally:
+        shutdown_video_job_queue()
+        shutdown_render_pool()
+        shutdown_dropbox_upload_executor()
+        shutdown_dropbox_download_executor()
+        await close_image_fetcher()
+
+
+app = FastAPI(lifespan=lifespan)
 
 # Per-process cache for the Dropbox client
 _dbx_client_cache: Optional[dropbox.Dropbox] = None
@@ -145,21 +169,31 @@ class CaptionRequest(BaseModel):
     dropbox_dir: Optional[str] = None
 
 
-class VideoGenerationRequest(BaseModel):
-    dropbox_folder_path: str
+# Video settings shared by /generate-video, /video-jobs and /caption-video
+class VideoSettings(BaseModel):
     audio_dropbox_path: Optional[str] = None
     save_to_dropbox: bool = False
     video_duration_per_text: float = 2.0
     fade_duration: float = 0.2
     line_thickness: int = 5
     line_color: str = "#FFFF00"
-    fps: int = 60
+    fps: int = Field(default=60, ge=1, le=120)
     gif_width_proportion: float = Field(default=0.8, ge=0.1, le=1.0)
     gif_offset_proportion: float = Field(default=0.2, ge=0.0, le=1.0)
     gif_duration: float = Field(default=2.0, ge=0.1)
     gif_framerate: int = Field(default=60, ge=1)
     # Optional outro video to append at the end. Defaults to repo asset if present.
     post_script_video_path: Optional[str] = None
+    encoder_profile: Optional[Literal["draft", "standard", "archival"]] = Field(
+        default=None,
+        description="Encoder speed/quality profile; defaults to VIDEO_ENCODER_PROFILE.")
+    vfr: Optional[bool] = Field(
+        default=None,
+        description="Encode only frames that change (variable frame rate); defaults to VIDEO_VFR.")
+
+
+class VideoGenerationRequest(VideoSettings):
+    dropbox_folder_path: str
 
 
 class AttachOutroRequest(BaseModel):
@@ -172,10 +206,38 @@ class AttachOutroRequest(BaseModel):
     dropbox_output_folder: Optional[str] = None
 
 
-def get_font_for_style(font_family_name: str, base_size: int,
-                       styles: Set[str]) -> ImageFont.FreeTypeFont:
-    is_bold = 'bold' in styles
-    is_italic = 'italic' in styles
+# Captions and video in one request: the caption fields plus the video
+# settings. dropbox_dir is only used for the final MP4.
+class CaptionVideoRequest(CaptionRequest, VideoSettings):
+    output_filename: Optional[str] = None
+
+
+# Bounded per-process LRU cache of loaded font objects
+FONT_CACHE_MAX_ENTRIES = int(os.getenv("FONT_CACHE_MAX_ENTRIES", "512"))
+_font_cache: "OrderedDict[tuple[str, int, bool, bool], ImageFont.FreeTypeFont]" = OrderedDict()
+_font_cache_stats = {"hits": 0, "misses": 0, "evictions": 0}
+_font_cache_lock = threading.Lock()
+# Font path that actually loaded for each (family, bold, italic), after fallbacks
+_resolved_font_paths: dict[tuple[str, bool, bool], str] = {}
+
+
+def get_font_cache_stats() -> dict:
+    with _font_cache_lock:
+        return {
+            **_font_cache_stats,
+            "size": len(_font_cache),
+            "max_entries": FONT_CACHE_MAX_ENTRIES,
+            "resolved_paths": len(_resolved_font_paths),
+        }
+
+
+def _resolve_and_load_font(font_family_name: str, base_size: int,
+                           is_bold: bool,
+                           is_italic: bool) -> ImageFont.FreeTypeFont:
+    resolve_key = (font_family_name, is_bold, is_italic)
+    resolved_path = _resolved_font_paths.get(resolve_key)
+    if resolved_path is not None:
+        return ImageFont.truetype(resolved_path, base_size)
 
     family_map = FONT_FAMILY_PATHS.get(
         font_family_name, FONT_FAMILY_PATHS[DEFAULT_FALLBACK_FONT_FAMILY])
@@ -191,8 +253,13 @@ def get_font_for_style(font_family_name: str, base_size: int,
     if not font_path:
         font_path = family_map.get("Regular", DEFAULT_FALLBACK_STYLE_PATH)
 
+    def load(path: str) -> ImageFont.FreeTypeFont:
+        font = ImageFont.truetype(path, base_size)
+        _resolved_font_paths[resolve_key] = path
+        return font
+
     try:
-        return ImageFont.truetype(font_path, base_size)
+        return load(font_path)
     except IOError as e:
         logging.warning(
             f"Failed to load font {font_path} for family {font_family_name} at size {base_size}: {e}. Attempting fallbacks."
@@ -204,7 +271,7 @@ def get_font_for_style(font_family_name: str, base_size: int,
                 logging.info(
                     f"Falling back to {regular_path} for family {font_family_name}."
                 )
-                return ImageFont.truetype(regular_path, base_size)
+                return load(regular_path)
             except IOError as e_reg:
                 logging.warning(
                     f"Failed to load regular style {family_map.get('Regular')} for {font_family_name}: {e_reg}"
@@ -216,8 +283,7 @@ def get_font_for_style(font_family_name: str, base_size: int,
                 logging.info(
                     f"Falling back to default application font: {DEFAULT_FALLBACK_STYLE_PATH}."
                 )
-                return ImageFont.truetype(DEFAULT_FALLBACK_STYLE_PATH,
-                                          base_size)
+                return load(DEFAULT_FALLBACK_STYLE_PATH)
             except IOError as e_default_fallback:
                 logging.error(
                     f"Default fallback font {DEFAULT_FALLBACK_STYLE_PATH} also failed: {e_default_fallback}"
@@ -225,17 +291,42 @@ def get_font_for_style(font_family_name: str, base_size: int,
 
         # Last resort: try to create a basic font
         try:
-            return ImageFont.truetype("arial.ttf", base_size)
+            return load("arial.ttf")
         except IOError:
             try:
-                return ImageFont.truetype("/System/Library/Fonts/Arial.ttf",
-                                          base_size)
+                return load("/System/Library/Fonts/Arial.ttf")
             except IOError:
                 logging.error(
                     "All font fallbacks failed including system fonts.")
                 raise Exception("Unable to load any font")
 
 
+def get_font_for_style(font_family_name: str, base_size: int,
+                       styles: Set[str]) -> ImageFont.FreeTypeFont:
+    is_bold = 'bold' in styles
+    is_italic = 'italic' in styles
+    cache_key = (font_family_name, base_size, is_bold, is_italic)
+
+    with _font_cache_lock:
+        font = _font_cache.get(cache_key)
+        if font is not None:
+            _font_cache.move_to_end(cache_key)
+            _font_cache_stats["hits"] += 1
+            return font
+        _font_cache_stats["misses"] += 1
+
+    font = _resolve_and_load_font(font_family_name, base_size, is_bold,
+                                  is_italic)
+
+    with _font_cache_lock:
+        _font_cache[cache_key] = font
+        _font_cache.move_to_end(cache_key)
+        while len(_font_cache) > max(1, FONT_CACHE_MAX_ENTRIES):
+            _font_cache.popitem(last=False)
+            _font_cache_stats["evictions"] += 1
+    return font
+
+
 def parse_html_text(html_text: str) -> list[list[tuple[str, Set[str]]]]:
     text_to_parse = html.unescape(html_text)
     soup = BeautifulSoup(text_to_parse, "html.parser")
@@ -317,7 +408,8 @@ def rgba_from_string(rgba_str: str) -> tuple[int, int, int, int]:
 def _generate_background_once(
         original_img: Image.Image, text_position: Literal["top", "bottom"],
         background_height: float, background_color: str,
-        transition_proportion: float) -> dict[str, Union[str, Image.Image]]:
+        transition_proportion: float,
+        output_format: str = "png") -> dict[str, Union[str, Image.Image]]:
     img = original_img.copy()
     width, height = img.size
 
@@ -329,37 +421,28 @@ def _generate_background_once(
 
     transition_height_px = int(round(bg_height * transition_proportion))
     if transition_height_px > 0 and bg_height > 0:
-        pixels = overlay.load()
-        if pixels is None:
-            logging.warning(
-                "Failed to load overlay pixels for gradient transition")
+        # Alpha ramp computed once per row, then stretched across the width
+        if transition_height_px == 1:
+            ramp = [0]
+        else:
+            ramp = [
+                int(round(base_a * (y_idx / (transition_height_px - 1.0))))
+                for y_idx in range(transition_height_px)
+            ]
+        if text_position == "top":
+            ramp.reverse()
+            transition_zone_start_y = bg_height - transition_height_px
         else:
-            if text_position == "bottom":
-                for y_coord in range(transition_height_px):
-                    if transition_height_px == 1:
-                        alpha_factor = 0.0
-                    else:
-                        alpha_factor = y_coord / (transition_height_px - 1.0)
-
-                    current_alpha = int(round(base_a * alpha_factor))
-                    for x_coord in range(width):
-                        pixels[x_coord, y_coord] = (base_r, base_g, base_b,
-                                                    current_alpha)
-
-            elif text_position == "top":
-                transition_zone_start_y = bg_height - transition_height_px
-                for y_idx, y_coord in enumerate(
-                        range(transition_zone_start_y, bg_height)):
-                    if transition_height_px == 1:
-                        alpha_factor = 0.0
-                    else:
-                        alpha_factor = (transition_height_px - 1.0 -
-                                        y_idx) / (transition_height_px - 1.0)
-
-                    current_alpha = int(round(base_a * alpha_factor))
-                    for x_coord in range(width):
-                        pixels[x_coord, y_coord] = (base_r, base_g, base_b,
-                                                    current_alpha)
+            transition_zone_start_y = 0
+
+        ramp_column = Image.frombytes("L", (1, transition_height_px),
+                                      bytes(ramp))
+        alpha_channel = overlay.getchannel("A")
+        alpha_channel.paste(
+            ramp_column.resize((width, transition_height_px),
+                               Image.Resampling.NEAREST),
+            (0, transition_zone_start_y))
+        overlay.putalpha(alpha_channel)
 
     background_only_img = img.copy()
     if text_position == "bottom":
@@ -368,6 +451,9 @@ def _generate_background_once(
         position = (0, 0)
     background_only_img.alpha_composite(overlay, dest=position)
 
+    if output_format == "raw":
+        return {"background_image": background_only_img, "overlay_image": overlay}
+
     bg_output_buffer = io.BytesIO()
     background_only_img.save(bg_output_buffer, format="PNG")
     bg_output_buffer.seek(0)
@@ -376,10 +462,187 @@ def _generate_background_once(
 
     return {
         "background_only_b64": background_only_b64,
+        "background_image": background_only_img,
         "overlay_image": overlay
     }
 
 
+# "bisect" searches font sizes by bisection; "linear" keeps the original 1..max scan
+FONT_FIT_STRATEGY = os.getenv("FONT_FIT_STRATEGY", "bisect")
+
+# Bounded per-process LRU of the last fitted size per layout geometry, used as
+# a search hint. It only shortens the search; the fitted size is the same
+# with or without it.
+FONT_FIT_HINT_MAX_ENTRIES = int(os.getenv("FONT_FIT_HINT_MAX_ENTRIES", "256"))
+_last_fitted_font_size: "OrderedDict[tuple, int]" = OrderedDict()
+_last_fitted_font_size_lock = threading.Lock()
+
+
+def _get_font_size_hint(hint_key: tuple) -> Optional[int]:
+    with _last_fitted_font_size_lock:
+        font_size = _last_fitted_font_size.get(hint_key)
+        if font_size is not None:
+            _last_fitted_font_size.move_to_end(hint_key)
+        return font_size
+
+
+def _remember_font_size_hint(hint_key: tuple, font_size: int) -> None:
+    with _last_fitted_font_size_lock:
+        _last_fitted_font_size[hint_key] = font_size
+        _last_fitted_font_size.move_to_end(hint_key)
+        while len(_last_fitted_font_size) > max(1, FONT_FIT_HINT_MAX_ENTRIES):
+            _last_fitted_font_size.popitem(last=False)
+
+
+def _layout_lines_at_font_size(
+    draw: ImageDraw.ImageDraw,
+    logical_lines_styled: list[list[tuple[str, Set[str]]]],
+    font_family: str,
+    font_size: int,
+    max_line_width: int,
+    available_height: int,
+) -> Optional[list]:
+    """
+    Word-wraps the styled lines at the given font size.
+    Returns the renderable line layout, or None if the text does not fit.
+    """
+    current_iter_renderable_lines = []
+    current_iter_total_height = 0
+
+    for logical_line in logical_lines_styled:
+        current_x = 0
+        max_ascent_in_line = 0
+        max_descent_in_line = 0
+        segments_for_current_render_line = []
+        drawable_units = []
+        for text_segment, styles_segment in logical_line:
+            parts = [p for p in re.split(r'(\s+)', text_segment) if p]
+            for part_text in parts:
+                drawable_units.append((part_text, styles_segment))
+
+        if not drawable_units and not logical_line:
+            placeholder_font = get_font_for_style(font_family, font_size,
+                                                  set())
+            ph_ascent, ph_descent = placeholder_font.getmetrics()
+            current_iter_total_height += (ph_ascent + ph_descent)
+            current_iter_renderable_lines.append([])
+            continue
+
+        for unit_text, styles_unit in drawable_units:
+            font_obj = get_font_for_style(font_family, font_size, styles_unit)
+            unit_width_measure = draw.textlength(unit_text, font=font_obj)
+            ascent, descent = font_obj.getmetrics()
+            if not unit_text.isspace(
+            ) and current_x == 0 and unit_width_measure > max_line_width:
+                return None
+            if not unit_text.isspace() and current_x != 0 and (
+                    current_x + unit_width_measure) > max_line_width:
+                if segments_for_current_render_line:
+                    current_iter_renderable_lines.append({
+                        "segments":
+                        segments_for_current_render_line,
+                        "height":
+                        max_ascent_in_line + max_descent_in_line,
+                        "max_ascent":
+                        max_ascent_in_line
+                    })
+                    current_iter_total_height += (max_ascent_in_line +
+                                                  max_descent_in_line)
+                segments_for_current_render_line = []
+                current_x = 0
+                max_ascent_in_line = 0
+                max_descent_in_line = 0
+            max_ascent_in_line = max(max_ascent_in_line, ascent)
+            max_descent_in_line = max(max_descent_in_line, descent)
+            segments_for_current_render_line.append({
+                "text": unit_text,
+                "styles": styles_unit,
+                "font": font_obj,
+                "width": unit_width_measure,
+                "ascent": ascent,
+                "descent": descent,
+                "bbox": font_obj.getbbox(unit_text)
+            })
+            current_x += unit_width_measure
+        if segments_for_current_render_line:
+            current_iter_renderable_lines.append({
+                "segments": segments_for_current_render_line,
+                "height": max_ascent_in_line + max_descent_in_line,
+                "max_ascent": max_ascent_in_line
+            })
+            current_iter_total_height += (max_ascent_in_line +
+                                          max_descent_in_line)
+
+    if current_iter_total_height < available_height:
+        return current_iter_renderable_lines
+    return None
+
+
+def _fit_font_size(layout_at_size, max_font_size: int,
+                   strategy: str = "bisect",
+                   hint: Optional[int] = None) -> tuple[int, list]:
+    """
+    Finds the largest font size in 1..max_font_size whose layout fits.
+    Returns (best_font_size, layout), or (0, []) if nothing fits.
+
+    "linear" tries sizes upward from 1 and stops at the first failure.
+    "bisect" relies on fit being monotonic in size and, given a hint, gallops
+    outward from it before bisecting, producing the same size as "linear".
+    """
+    if strategy == "linear":
+        best_font_size = 0
+        best_layout: list = []
+        for font_size in range(1, max_font_size + 1):
+            layout = layout_at_size(font_size)
+            if layout is None:
+                break
+            best_font_size, best_layout = font_size, layout
+        return best_font_size, best_layout
+
+    layouts: dict[int, list] = {}
+
+    def fits(font_size: int) -> bool:
+        layout = layout_at_size(font_size)
+        if layout is None:
+            return False
+        layouts[font_size] = layout
+        return True
+
+    # Invariant: lo fits (or is 0), hi does not fit (or is max_font_size + 1)
+    lo, hi = 0, max_font_size + 1
+    if hint is not None:
+        start = max(1, min(max_font_size, hint))
+        step = 1
+        if fits(start):
+            lo = start
+            while lo + step < hi:
+                if fits(lo + step):
+                    lo += step
+                    step *= 2
+                else:
+                    hi = lo + step
+                    break
+        else:
+            hi = start
+            while hi - step > lo:
+                if fits(hi - step):
+                    lo = hi - step
+                    break
+                hi -= step
+                step *= 2
+
+    while hi - lo > 1:
+        mid = (lo + hi) // 2
+        if fits(mid):
+            lo = mid
+        else:
+            hi = mid
+
+    if lo == 0:
+        return 0, []
+    return lo, layouts[lo]
+
+
 def _generate_text_and_combined_image_from_background(
     original_img: Image.Image,
     overlay_image: Image.Image,
@@ -390,7 +653,15 @@ def _generate_text_and_combined_image_from_background(
     margin_horizontal: int,
     margin_top: int,
     margin_bottom: int,
-) -> dict[str, str]:
+    font_size_hint: Optional[int] = None,
+    font_fit_strategy: Optional[str] = None,
+    output_format: str = "png",
+) -> dict:
+    """
+    Renders one text onto the background band. Returns base64 PNGs of the
+    text-only and combined images, or with output_format="raw" only the
+    text's drawn pixels as an uncompressed RGBA crop (see raw_text_image).
+    """
     img = original_img.copy()
     width, height = img.size
     bg_height = int(height * background_height)
@@ -407,101 +678,25 @@ def _generate_text_and_combined_image_from_background(
     final_renderable_lines_layout = []
 
     if any(line for line in logical_lines_styled):
-        font_size_iter = 1
         max_iter_font_size = max(1, min(bg_height, width, 200))
-
-        while font_size_iter <= max_iter_font_size:
-            current_iter_renderable_lines = []
-            current_iter_total_height = 0
-            possible_to_fit_this_size = True
-
-            for logical_line in logical_lines_styled:
-                if not possible_to_fit_this_size: break
-                current_x = 0
-                max_ascent_in_line = 0
-                max_descent_in_line = 0
-                segments_for_current_render_line = []
-                drawable_units = []
-                for text_segment, styles_segment in logical_line:
-                    parts = [p for p in re.split(r'(\s+)', text_segment) if p]
-                    for part_text in parts:
-                        drawable_units.append((part_text, styles_segment))
-
-                if not drawable_units and not logical_line:
-                    placeholder_font = get_font_for_style(
-                        font_family, font_size_iter, set())
-                    ph_ascent, ph_descent = placeholder_font.getmetrics()
-                    current_iter_total_height += (ph_ascent + ph_descent)
-                    current_iter_renderable_lines.append([])
-                    continue
-
-                for unit_text, styles_unit in drawable_units:
-                    font_obj = get_font_for_style(font_family, font_size_iter,
-                                                  styles_unit)
-                    unit_width_measure = draw.textlength(unit_text,
-                                                         font=font_obj)
-                    ascent, descent = font_obj.getmetrics()
-                    if not unit_text.isspace(
-                    ) and current_x == 0 and unit_width_measure > (
-                            width - 2 * margin_x_px):
-                        possible_to_fit_this_size = False
-                        break
-                    if not unit_text.isspace() and current_x != 0 and (
-                            current_x +
-                            unit_width_measure) > (width - 2 * margin_x_px):
-                        if segments_for_current_render_line:
-                            current_iter_renderable_lines.append({
-                                "segments":
-                                segments_for_current_render_line,
-                                "height":
-                                max_ascent_in_line + max_descent_in_line,
-                                "max_ascent":
-                                max_ascent_in_line
-                            })
-                            current_iter_total_height += (max_ascent_in_line +
-                                                          max_descent_in_line)
-                        segments_for_current_render_line = []
-                        current_x = 0
-                        max_ascent_in_line = 0
-                        max_descent_in_line = 0
-                    max_ascent_in_line = max(max_ascent_in_line, ascent)
-                    max_descent_in_line = max(max_descent_in_line, descent)
-                    segments_for_current_render_line.append({
-                        "text":
-                        unit_text,
-                        "styles":
-                        styles_unit,
-                        "font":
-                        font_obj,
-                        "width":
-                        unit_width_measure,
-                        "ascent":
-                        ascent,
-                        "descent":
-                        descent,
-                        "bbox":
-                        font_obj.getbbox(unit_text)
-                    })
-                    current_x += unit_width_measure
-                if not possible_to_fit_this_size: break
-                if segments_for_current_render_line:
-                    current_iter_renderable_lines.append({
-                        "segments":
-                        segments_for_current_render_line,
-                        "height":
-                        max_ascent_in_line + max_descent_in_line,
-                        "max_ascent":
-                        max_ascent_in_line
-                    })
-                    current_iter_total_height += (max_ascent_in_line +
-                                                  max_descent_in_line)
-            if possible_to_fit_this_size and current_iter_total_height < (
-                    bg_height - margin_top_px - margin_bottom_px):
-                best_font_size = font_size_iter
-                final_renderable_lines_layout = current_iter_renderable_lines
-                font_size_iter += 1
-            else:
-                break
+        hint_key = (font_family, width, bg_height, margin_horizontal,
+                    margin_top, margin_bottom)
+        if font_size_hint is None:
+            font_size_hint = _get_font_size_hint(hint_key)
+
+        def layout_at_size(font_size: int) -> Optional[list]:
+            return _layout_lines_at_font_size(
+                draw, logical_lines_styled, font_family, font_size,
+                width - 2 * margin_x_px,
+                bg_height - margin_top_px - margin_bottom_px)
+
+        best_font_size, final_renderable_lines_layout = _fit_font_size(
+            layout_at_size,
+            max_iter_font_size,
+            strategy=font_fit_strategy or FONT_FIT_STRATEGY,
+            hint=font_size_hint)
+        if best_font_size > 0:
+            _remember_font_size_hint(hint_key, best_font_size)
 
     if best_font_size > 0 and final_renderable_lines_layout:
         font = get_font_for_style(font_family, best_font_size, set())
@@ -564,12 +759,27 @@ def _generate_text_and_combined_image_from_background(
 
             current_y += line_actual_height
 
-    text_only_full_image = Image.new("RGBA", (width, height), (0, 0, 0, 0))
     if text_position == "bottom":
         text_paste_position = (0, height - bg_height)
     else:
         text_paste_position = (0, 0)
 
+    if output_format == "raw":
+        # Only the drawn pixels go back to the caller, uncompressed; the
+        # frames pipeline composites them itself and needs no PNGs
+        bbox = text_on_bg_overlay.getchannel("A").getbbox()
+        if bbox is None:
+            return {"text_only_raw": {"size": (width, height), "offset": (0, 0),
+                                      "crop_size": (0, 0), "data": b""}}
+        crop = text_on_bg_overlay.crop(bbox)
+        return {"text_only_raw": {
+            "size": (width, height),
+            "offset": (text_paste_position[0] + bbox[0], text_paste_position[1] + bbox[1]),
+            "crop_size": crop.size,
+            "data": crop.tobytes(),
+        }}
+
+    text_only_full_image = Image.new("RGBA", (width, height), (0, 0, 0, 0))
     text_only_full_image.paste(text_on_bg_overlay, text_paste_position)
 
     text_output_buffer = io.BytesIO()
@@ -598,9 +808,101 @@ def _generate_text_and_combined_image_from_background(
     return result
 
 
+# Raw image buffers are shared with render workers through a memory-mapped
+# temp file, on tmpfs when available. Docker limits /dev/shm to 64 MB by
+# default (raise it with --shm-size); a request whose buffers do not fit there
+# falls back to the regular temp directory.
+SHARED_IMAGE_DIR = os.getenv("SHARED_IMAGE_DIR") or (
+    "/dev/shm" if os.path.isdir("/dev/shm") else None)
+
+
+class SharedImageBuffers:
+    """
+    Publishes decoded images once per request as raw buffers in a temp file.
+    Workers map the file read-only via attach_shared_images().
+    """
+
+    def __init__(self, images: dict[str, Image.Image]):
+        try:
+            self._write(images, SHARED_IMAGE_DIR)
+        except OSError as e:
+            fallback_dir = tempfile.gettempdir()
+            if SHARED_IMAGE_DIR is None or os.path.abspath(SHARED_IMAGE_DIR) == os.path.abspath(fallback_dir):
+                raise
+            logging.warning(
+                f"Could not write shared image buffers to {SHARED_IMAGE_DIR} ({e}); using {fallback_dir} instead")
+            self._write(images, fallback_dir)
+
+    def _write(self, images: dict[str, Image.Image], directory: Optional[str]) -> None:
+        fd, self.path = tempfile.mkstemp(prefix="caption_",
+                                         suffix=".raw",
+                                         dir=directory)
+        self.layout: dict[str, dict] = {}
+        offset = 0
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for name, img in images.items():
+                    data = img.tobytes()
+                    f.write(data)
+                    self.layout[name] = {
+                        "offset": offset,
+                        "length": len(data),
+                        "size": img.size,
+                        "mode": img.mode,
+                    }
+                    offset += len(data)
+        except Exception:
+            self.close()
+            raise
+
+    def descriptor(self) -> dict:
+        return {"path": self.path, "images": self.layout}
+
+    def close(self) -> None:
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+    def __enter__(self) -> "SharedImageBuffers":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+@contextmanager
+def attach_shared_images(descriptor: dict):
+    """
+    Maps the buffers published by SharedImageBuffers and yields them as
+    read-only PIL images that share memory with the mapping. The images must
+    not be used after the block exits.
+    """
+    with open(descriptor["path"], "rb") as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    views = []
+    images: dict[str, Image.Image] = {}
+    try:
+        for name, meta in descriptor["images"].items():
+            view = memoryview(mapped)[meta["offset"]:meta["offset"] +
+                                      meta["length"]]
+            views.append(view)
+            images[name] = Image.frombuffer(meta["mode"], tuple(meta["size"]),
+                                            view, "raw", meta["mode"], 0, 1)
+        yield images
+    finally:
+        images.clear()
+        try:
+            for view in views:
+                view.release()
+            mapped.close()
+        except BufferError as e:
+            logging.warning(
+                f"Shared image buffer still referenced on release, leaving it to GC: {e}")
+
+
 def _process_text(
-    original_img_bytes: bytes,
-    overlay_image_bytes: bytes,
+    shared_images: dict,
     text_content: str,
     font_family: Literal["Montserrat", "Nunito", "Poppins", "Roboto"],
     text_position: Literal["top", "bottom"],
@@ -609,34 +911,260 @@ def _process_text(
     margin_top: int,
     margin_bottom: int,
     text_index: int,
+    output_format: str = "png",
 ) -> dict:
     try:
-        original_img = Image.open(io.BytesIO(original_img_bytes))
-        overlay_image = Image.open(io.BytesIO(overlay_image_bytes))
-
-        captioned_images = _generate_text_and_combined_image_from_background(
-            original_img=original_img,
-            overlay_image=overlay_image,
-            text_content=text_content,
-            font_family=font_family,
-            text_position=text_position,
-            background_height=background_height,
-            margin_horizontal=margin_horizontal,
-            margin_top=margin_top,
-            margin_bottom=margin_bottom,
-        )
-        return {
-            "success": True,
-            "text_only": captioned_images["text_only"],
-            "final_combined": captioned_images["final_combined"],
-            "index": text_index,
-        }
+        with attach_shared_images(shared_images) as images:
+            captioned_images = _generate_text_and_combined_image_from_background(
+                original_img=images["original"],
+                overlay_image=images["overlay"],
+                text_content=text_content,
+                font_family=font_family,
+                text_position=text_position,
+                background_height=background_height,
+                margin_horizontal=margin_horizontal,
+                margin_top=margin_top,
+                margin_bottom=margin_bottom,
+                output_format=output_format,
+            )
+        return {"success": True, **captioned_images, "index": text_index}
     except Exception as e:
         logging.error(f"Error processing text '{text_content}': {e}",
                       exc_info=True)
         return {"success": False, "error": str(e)}
 
 
+# Size of the shared render pool; 0 or unset means one worker per CPU core
+RENDER_POOL_SIZE = int(os.getenv("RENDER_POOL_SIZE", "0")) or os.cpu_count() or 1
+
+
+def _init_render_worker() -> None:
+    """
+    Initializer for render pool workers: imports the rendering modules and
+    resolves every configured font face into the font cache.
+    """
+    import bs4  # noqa: F401
+    import dropbox  # noqa: F401
+    from PIL import PngImagePlugin  # noqa: F401
+
+    for family_name in FONT_FAMILY_PATHS:
+        for styles in (set(), {"bold"}, {"italic"}, {"bold", "italic"}):
+            try:
+                get_font_for_style(family_name, 12, styles)
+            except Exception as e:
+                logging.warning(
+                    f"Process {os.getpid()}: Failed to preload font {family_name} {sorted(styles)}: {e}"
+                )
+    logging.info(f"Process {os.getpid()}: Render worker initialized.")
+
+
+def _warm_render_worker() -> int:
+    return os.getpid()
+
+
+def _run_in_render_worker(fn, *args):
+    """
+    Runs fn in a render worker and returns its result together with the
+    worker's pid and font cache counters, so the parent can report them.
+    """
+    return fn(*args), os.getpid(), get_font_cache_stats()
+
+
+class RenderPool:
+    """
+    Long-lived process pool shared by all /caption-image requests.
+    Tracks in-flight work so the queue depth can be reported. If a worker
+    dies (e.g. OOM-killed), the broken executor is replaced with a fresh one.
+    """
+
+    def __init__(self, max_workers: int):
+        self.max_workers = max(1, max_workers)
+        self.executor = self._new_executor()
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.restarts = 0
+        # Latest font cache counters reported by each live worker, by pid
+        self.font_cache_stats: dict[int, dict] = {}
+
+    def _new_executor(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(max_workers=self.max_workers,
+                                   initializer=_init_render_worker)
+
+    async def warm_up(self) -> None:
+        loop = asyncio.get_running_loop()
+        pids = await asyncio.gather(*[
+            loop.run_in_executor(self.executor, _warm_render_worker)
+            for _ in range(self.max_workers)
+        ])
+        logging.info(
+            f"Render pool ready with {len(set(pids))} of {self.max_workers} workers.")
+
+    async def _restart(self, broken: ProcessPoolExecutor) -> None:
+        # Every task in flight on the broken executor fails at once; only the
+        # first one to get here replaces it
+        if self.executor is not broken:
+            return
+        self.restarts += 1
+        logging.error("A render worker died; restarting the render pool.")
+        self.executor = self._new_executor()
+        self.font_cache_stats.clear()
+        broken.shutdown(wait=False, cancel_futures=True)
+        await self.warm_up()
+
+    async def run(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        self.in_flight += 1
+        self.submitted += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        executor = self.executor
+        try:
+            result, pid, font_stats = await loop.run_in_executor(
+                executor, _run_in_render_worker, fn, *args)
+        except BrokenProcessPool:
+            self.failed += 1
+            await self._restart(executor)
+            raise
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self.in_flight -= 1
+        self.completed += 1
+        if executor is self.executor:
+            self.font_cache_stats[pid] = font_stats
+        return result
+
+    def _font_cache_totals(self) -> dict:
+        totals = {"workers_reporting": len(self.font_cache_stats),
+                  "hits": 0, "misses": 0, "evictions": 0, "size": 0}
+        for worker_stats in self.font_cache_stats.values():
+            for key in ("hits", "misses", "evictions", "size"):
+                totals[key] += worker_stats[key]
+        totals["max_entries_per_worker"] = FONT_CACHE_MAX_ENTRIES
+        return totals
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.max_workers,
+            "in_flight": self.in_flight,
+            "queued": max(0, self.in_flight - self.max_workers),
+            "peak_in_flight": self.peak_in_flight,
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "restarts": self.restarts,
+            "font_cache": self._font_cache_totals(),
+        }
+
+    def shutdown(self) -> None:
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+
+_render_pool: Optional[RenderPool] = None
+
+
+async def start_render_pool() -> RenderPool:
+    """
+    Creates and pre-warms the shared render pool if it is not running yet.
+    """
+    global _render_pool
+    if _render_pool is None:
+        logging.info(f"Starting render pool with {RENDER_POOL_SIZE} workers.")
+        _render_pool = RenderPool(RENDER_POOL_SIZE)
+        await _render_pool.warm_up()
+    return _render_pool
+
+
+def shutdown_render_pool() -> None:
+    global _render_pool
+    if _render_pool is not None:
+        _render_pool.shutdown()
+        _render_pool = None
+
+
+# Source image fetching: timeouts in seconds, body size cap in bytes
+IMAGE_FETCH_CONNECT_TIMEOUT = float(os.getenv("IMAGE_FETCH_CONNECT_TIMEOUT", "5"))
+IMAGE_FETCH_READ_TIMEOUT = float(os.getenv("IMAGE_FETCH_READ_TIMEOUT", "30"))
+IMAGE_FETCH_MAX_BYTES = int(os.getenv("IMAGE_FETCH_MAX_BYTES", str(50 * 1024 * 1024)))
+IMAGE_FETCH_MAX_CONNECTIONS = int(os.getenv("IMAGE_FETCH_MAX_CONNECTIONS", "20"))
+IMAGE_FETCH_MAX_PER_HOST = int(os.getenv("IMAGE_FETCH_MAX_PER_HOST", "4"))
+
+_image_fetcher: Optional[ImageFetcher] = None
+
+
+def get_image_fetcher() -> ImageFetcher:
+    """
+    Returns the shared async image fetcher, creating it on first use.
+    """
+    global _image_fetcher
+    if _image_fetcher is None:
+        _image_fetcher = ImageFetcher(
+            connect_timeout=IMAGE_FETCH_CONNECT_TIMEOUT,
+            read_timeout=IMAGE_FETCH_READ_TIMEOUT,
+            max_bytes=IMAGE_FETCH_MAX_BYTES,
+            max_connections=IMAGE_FETCH_MAX_CONNECTIONS,
+            max_per_host=IMAGE_FETCH_MAX_PER_HOST,
+        )
+    return _image_fetcher
+
+
+async def close_image_fetcher() -> None:
+    global _image_fetcher, _image_cache
+    _image_cache = None
+    if _image_fetcher is not None:
+        await _image_fetcher.aclose()
+        _image_fetcher = None
+
+
+# On-disk cache of fetched source images; a budget of 0 disables it
+IMAGE_CACHE_DIR = os.getenv("IMAGE_CACHE_DIR") or os.path.join(
+    tempfile.gettempdir(), "caption_image_cache")
+IMAGE_CACHE_MAX_BYTES = int(os.getenv("IMAGE_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+
+_image_cache: Optional[ImageCache] = None
+
+
+async def fetch_source_image(url: str) -> bytes:
+    """
+    Returns the bytes of a source image, through the on-disk cache when enabled.
+    """
+    global _image_cache
+    if IMAGE_CACHE_MAX_BYTES <= 0:
+        return await get_image_fetcher().fetch_bytes(url)
+    if _image_cache is None:
+        _image_cache = ImageCache(get_image_fetcher(), IMAGE_CACHE_DIR,
+                                  IMAGE_CACHE_MAX_BYTES)
+    return await _image_cache.get(url)
+
+
+# Number of Dropbox uploads a single process runs at the same time
+DROPBOX_UPLOAD_CONCURRENCY = int(os.getenv("DROPBOX_UPLOAD_CONCURRENCY", "8"))
+
+_dropbox_upload_executor: Optional[ThreadPoolExecutor] = None
+
+
+def get_dropbox_upload_executor() -> ThreadPoolExecutor:
+    """
+    Returns the bounded thread pool that runs blocking Dropbox uploads off the event loop.
+    """
+    global _dropbox_upload_executor
+    if _dropbox_upload_executor is None:
+        _dropbox_upload_executor = ThreadPoolExecutor(
+            max_workers=max(1, DROPBOX_UPLOAD_CONCURRENCY),
+            thread_name_prefix="dropbox-upload")
+    return _dropbox_upload_executor
+
+
+def shutdown_dropbox_upload_executor() -> None:
+    global _dropbox_upload_executor
+    if _dropbox_upload_executor is not None:
+        _dropbox_upload_executor.shutdown(wait=True)
+        _dropbox_upload_executor = None
+
+
 @app.get("/test")
 def test_endpoint():
     return {
@@ -645,47 +1173,55 @@ def test_endpoint():
     }
 
 
-@app.post("/caption-image")
-async def caption_image(req: CaptionRequest):
-    try:
-        logging.info(f"Received request: {req}")
+@app.get("/stats/render-pool")
+def render_pool_stats():
+    if _render_pool is None:
+        return {"workers": 0, "running": False}
+    return {**_render_pool.stats(), "running": True}
 
-        headers = {
-            "User-Agent":
-            "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-        }
-        response = requests.get(req.image_url, headers=headers)
-        response.raise_for_status()
-        original_img = Image.open(io.BytesIO(response.content)).convert("RGBA")
-
-        background_data = _generate_background_once(
-            original_img=original_img,
-            text_position=req.text_position,
-            background_height=req.background_height,
-            background_color=req.background_color,
-            transition_proportion=req.transition_proportion)
-        overlay_image = background_data["overlay_image"]
-
-        if not isinstance(overlay_image, Image.Image):
-            raise TypeError("Generated overlay is not a valid PIL Image")
 
-        original_img_buffer = io.BytesIO()
-        original_img.save(original_img_buffer, format="PNG")
-        original_img_bytes = original_img_buffer.getvalue()
+@app.get("/stats/image-cache")
+def image_cache_stats():
+    if IMAGE_CACHE_MAX_BYTES <= 0:
+        return {"enabled": False}
+    stats = dict(_image_cache.stats) if _image_cache is not None else {}
+    return {**stats, "enabled": True, "max_bytes": IMAGE_CACHE_MAX_BYTES}
 
-        overlay_image_buffer = io.BytesIO()
-        overlay_image.save(overlay_image_buffer, format="PNG")
-        overlay_image_bytes = overlay_image_buffer.getvalue()
 
-        loop = asyncio.get_running_loop()
-        with ProcessPoolExecutor() as pool:
-            tasks = []
-            for i, text_content in enumerate(req.texts):
-                task = loop.run_in_executor(
-                    pool,
+async def render_caption_images(req: CaptionRequest,
+                                output_format: str = "png") -> tuple[dict, list]:
+    """
+    Fetches the source image, renders the shared background once and every
+    text on the render pool. Returns the background data and the per-text
+    results in request order. output_format="raw" skips the PNG encoding and
+    returns images for the frames pipeline instead (see collect_caption_images).
+    """
+    image_bytes = await fetch_source_image(req.image_url)
+    original_img = Image.open(io.BytesIO(image_bytes)).convert("RGBA")
+
+    background_data = _generate_background_once(
+        original_img=original_img,
+        text_position=req.text_position,
+        background_height=req.background_height,
+        background_color=req.background_color,
+        transition_proportion=req.transition_proportion,
+        output_format=output_format)
+    overlay_image = background_data["overlay_image"]
+
+    if not isinstance(overlay_image, Image.Image):
+        raise TypeError("Generated overlay is not a valid PIL Image")
+
+    pool = await start_render_pool()
+    with SharedImageBuffers({
+            "original": original_img,
+            "overlay": overlay_image
+    }) as shared_images:
+        tasks = []
+        for i, text_content in enumerate(req.texts):
+            tasks.append(
+                pool.run(
                     _process_text,
-                    original_img_bytes,
-                    overlay_image_bytes,
+                    shared_images.descriptor(),
                     text_content,
                     req.font_family,
                     req.text_position,
@@ -694,29 +1230,38 @@ async def caption_image(req: CaptionRequest):
                     req.margin_top,
                     req.margin_bottom,
                     i,
-                )
-                tasks.append(task)
+                    output_format,
+                ))
+
+        results = await asyncio.gather(*tasks)
+    return background_data, results
+
+
+@app.post("/caption-image")
+async def caption_image(req: CaptionRequest):
+    try:
+        logging.info(f"Received request: {req}")
 
-            results = await asyncio.gather(*tasks)
+        background_data, results = await render_caption_images(req)
 
         if req.dropbox_dir:
+            dropbox_dir = req.dropbox_dir.rstrip('/')
             # Ensure folders
-            dbx = get_dbx_client_cached()
-            ensure_dropbox_folder(dbx, req.dropbox_dir)
-            ensure_dropbox_folder(dbx, f"{req.dropbox_dir.rstrip('/')}/text_only")
-            ensure_dropbox_folder(dbx, f"{req.dropbox_dir.rstrip('/')}/final_combined")
-
-            # Upload background first
+            storage = get_storage()
+            await asyncio.to_thread(storage.ensure_dir, [
+                f"{dropbox_dir}/text_only",
+                f"{dropbox_dir}/final_combined",
+            ])
+
+            # Background first, then each generated image sorted by index so
+            # the file names and their order are deterministic; all of them
+            # are stored in one batch
+            uploads = []
             background_b64 = background_data.get("background_only_b64")
             if isinstance(background_b64, str):
-                upload_bytes(
-                    dbx,
-                    base64.b64decode(background_b64),
-                    f"{req.dropbox_dir.rstrip('/')}/background.png",
-                )
+                uploads.append((base64.b64decode(background_b64),
+                                f"{dropbox_dir}/background.png"))
 
-            # Upload each generated image sequentially
-            # Sort by index to ensure deterministic order
             sorted_results = sorted(
                 [r for r in results if r.get("success")], key=lambda x: x.get("index", 0)
             )
@@ -725,27 +1270,44 @@ async def caption_image(req: CaptionRequest):
                 text_only_b64 = r.get("text_only")
                 final_combined_b64 = r.get("final_combined")
                 if isinstance(text_only_b64, str):
-                    upload_bytes(
-                        dbx,
-                        base64.b64decode(text_only_b64),
-                        f"{req.dropbox_dir.rstrip('/')}/text_only/text_{idx:02d}_text.png",
-                    )
+                    uploads.append((base64.b64decode(text_only_b64),
+                                    f"{dropbox_dir}/text_only/text_{idx:02d}_text.png"))
                 if isinstance(final_combined_b64, str):
-                    upload_bytes(
-                        dbx,
-                        base64.b64decode(final_combined_b64),
-                        f"{req.dropbox_dir.rstrip('/')}/final_combined/text_{idx:02d}_combined.png",
-                    )
+                    uploads.append((base64.b64decode(final_combined_b64),
+                                    f"{dropbox_dir}/final_combined/text_{idx:02d}_combined.png"))
+
+            upload_outcomes = await asyncio.to_thread(storage.put_many, uploads)
+            uploaded_files = [
+                path for path, error in upload_outcomes.items() if error is None
+            ]
+            failed_files = {
+                path: error
+                for path, error in upload_outcomes.items() if error is not None
+            }
 
             n = len(req.texts)
-            return {"dropbox_dir": req.dropbox_dir, "message": f"{n} images generated"}
+            message = f"{n} images generated"
+            if failed_files:
+                message += f", {len(failed_files)} uploads failed"
+            body = {
+                "dropbox_dir": req.dropbox_dir,
+                "message": message,
+                "files": uploaded_files,
+                "failed_files": failed_files,
+            }
+            # 502 when nothing could be stored, 207 when only some files were
+            if failed_files and not uploaded_files:
+                return JSONResponse(status_code=502, content=body)
+            if failed_files:
+                return JSONResponse(status_code=207, content=body)
+            return body
         else:
             return {
                 "background_only": background_data["background_only_b64"],
                 "images": results,
             }
 
-    except requests.exceptions.RequestException as e:
+    except ImageFetchError as e:
         logging.error(f"Error fetching image: {e}")
         raise HTTPException(
             status_code=400,
@@ -756,6 +1318,391 @@ async def caption_image(req: CaptionRequest):
                             detail=f"An unexpected error occurred: {str(e)}")
 
 
+# Number of Dropbox downloads a single process runs at the same time
+DROPBOX_DOWNLOAD_CONCURRENCY = int(os.getenv("DROPBOX_DOWNLOAD_CONCURRENCY", "8"))
+
+_dropbox_download_executor: Optional[ThreadPoolExecutor] = None
+
+
+def get_dropbox_download_executor() -> ThreadPoolExecutor:
+    """
+    Returns the bounded thread pool shared by all Dropbox downloads in this process.
+    """
+    global _dropbox_download_executor
+    if _dropbox_download_executor is None:
+        _dropbox_download_executor = ThreadPoolExecutor(
+            max_workers=max(1, DROPBOX_DOWNLOAD_CONCURRENCY),
+            thread_name_prefix="dropbox-download")
+    return _dropbox_download_executor
+
+
+# Local cache of reusable Dropbox assets (outros, music, backgrounds); a cap of 0 disables it
+ASSET_CACHE_DIR = os.getenv("ASSET_CACHE_DIR") or os.path.join(
+    tempfile.gettempdir(), "dropbox_asset_cache")
+ASSET_CACHE_MAX_BYTES = int(os.getenv("ASSET_CACHE_MAX_BYTES", str(2 * 1024 * 1024 * 1024)))
+
+_asset_cache: Optional[DropboxAssetCache] = None
+
+
+def get_asset_cache() -> Optional[DropboxAssetCache]:
+    """
+    Returns the per-process Dropbox asset cache, or None when it is disabled.
+    """
+    global _asset_cache
+    if ASSET_CACHE_MAX_BYTES <= 0:
+        return None
+    if _asset_cache is None:
+        _asset_cache = DropboxAssetCache(ASSET_CACHE_DIR, ASSET_CACHE_MAX_BYTES)
+    return _asset_cache
+
+
+# Where inputs are read from and outputs written to: "dropbox" (default) or
+# "local", which maps every path onto LOCAL_STORAGE_ROOT instead
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "dropbox").strip().lower()
+LOCAL_STORAGE_ROOT = os.getenv("LOCAL_STORAGE_ROOT") or os.path.join(
+    tempfile.gettempdir(), "captionate_storage")
+
+_storage: Optional[StorageBackend] = None
+
+
+def get_storage() -> StorageBackend:
+    """
+    Returns the storage backend selected by STORAGE_BACKEND for the current process.
+    """
+    global _storage
+    if _storage is None:
+        if STORAGE_BACKEND == "local":
+            _storage = LocalStorage(LOCAL_STORAGE_ROOT)
+        elif STORAGE_BACKEND == "dropbox":
+            _storage = DropboxStorage(get_dbx_client_cached,
+                                      upload_executor=get_dropbox_upload_executor(),
+                                      asset_cache=get_asset_cache())
+        else:
+            raise ValueError(
+                f"Unknown STORAGE_BACKEND '{STORAGE_BACKEND}'. Use 'dropbox' or 'local'.")
+        logging.info(f"Process {os.getpid()}: Using {_storage.name} storage backend.")
+    return _storage
+
+
+def shutdown_dropbox_download_executor() -> None:
+    global _dropbox_download_executor
+    if _dropbox_download_executor is not None:
+        _dropbox_download_executor.shutdown(wait=True)
+        _dropbox_download_executor = None
+
+
+def submit_outro_download(post_script_video_path: Optional[str], temp_dir: str,
+                          storage: StorageBackend, downloads: ThreadPoolExecutor):
+    """
+    Resolves the optional outro video. A path that exists locally (absolute or
+    relative) is used as is; anything else is treated as a storage path and
+    downloaded to temp_dir on the download pool. Returns (local_path, future),
+    where future is None when nothing has to be downloaded.
+    """
+    if not post_script_video_path:
+        return None, None
+    provided = post_script_video_path
+    if os.path.isabs(provided) and os.path.exists(provided):
+        return provided, None
+    if os.path.exists(provided):
+        return os.path.abspath(provided), None
+    outro_name = os.path.basename(provided.rstrip('/')) or "outro.mov"
+    outro_local_path = os.path.join(temp_dir, outro_name)
+    logging.info(
+        f"Downloading outro from {storage.name} storage '{provided}' to '{outro_local_path}'")
+    return outro_local_path, downloads.submit(storage.get, provided,
+                                              outro_local_path, reusable=True)
+
+
+def wait_for_outro(post_script_video_path: Optional[str],
+                   outro_local_path: Optional[str], outro_future) -> Optional[str]:
+    """
+    Waits for the outro download, if any. A missing or failed outro is logged
+    and skipped rather than failing the video, so this returns None in that case.
+    """
+    if not post_script_video_path:
+        return None
+    try:
+        if outro_future is not None:
+            outro_future.result()
+        if outro_local_path and os.path.exists(outro_local_path):
+            return outro_local_path
+        logging.warning(
+            f"Post script video not found or failed to download: {post_script_video_path}. Skipping outro.")
+    except Exception as e:
+        logging.warning(
+            f"Failed to attach post script video '{post_script_video_path}': {e}")
+    return None
+
+
+def settle_downloads(futures) -> None:
+    """
+    Cancels the downloads that have not started and waits for the running
+    ones, so none of them is still writing once its temp dir is removed.
+    """
+    futures = [future for future in futures if future is not None]
+    for future in futures:
+        future.cancel()
+    wait(futures)
+
+
+# create_vid.sh pipeline: "single" encodes once from one filter graph, "multi"
+# encodes a segment per text and concatenates them; "auto" picks single pass
+# for scripts of up to VIDEO_SINGLE_PASS_MAX_TEXTS texts. "frames" composites
+# the frames here with CaptionFrameRenderer and pipes them to the final encode.
+VIDEO_PIPELINE_MODE = os.getenv("VIDEO_PIPELINE_MODE", "auto")
+VIDEO_SINGLE_PASS_MAX_TEXTS = int(os.getenv("VIDEO_SINGLE_PASS_MAX_TEXTS", "30"))
+# Multi-pass segments encoded at the same time (0 = CPU count / threads) and
+# the encoder thread cap for each of them
+VIDEO_SEGMENT_JOBS = int(os.getenv("VIDEO_SEGMENT_JOBS", "0"))
+VIDEO_SEGMENT_THREADS = int(os.getenv("VIDEO_SEGMENT_THREADS", "2"))
+# Multi-pass segments reused across runs, keyed by content; a cap of 0 disables it
+VIDEO_SEGMENT_CACHE_DIR = os.getenv("VIDEO_SEGMENT_CACHE_DIR") or os.path.join(
+    tempfile.gettempdir(), "video_segment_cache")
+VIDEO_SEGMENT_CACHE_MAX_BYTES = int(os.getenv("VIDEO_SEGMENT_CACHE_MAX_BYTES", str(1024 * 1024 * 1024)))
+
+# Named libx264 speed/quality trade-offs; the GOP is given in seconds and
+# converted to frames at the requested fps, threads 0 lets ffmpeg decide
+ENCODER_PROFILES = {
+    "draft": {"preset": "ultrafast", "crf": 28, "tune": "stillimage", "gop_seconds": 4, "threads": 0},
+    "standard": {"preset": "medium", "crf": 23, "tune": "stillimage", "gop_seconds": 2, "threads": 0},
+    "archival": {"preset": "slow", "crf": 18, "tune": "stillimage", "gop_seconds": 1, "threads": 0},
+}
+VIDEO_ENCODER_PROFILE = os.getenv("VIDEO_ENCODER_PROFILE", "standard")
+# Variable frame rate output: static holds are encoded as long frames instead
+# of repeated ones. Only pays off when the line steps slower than the fps.
+VIDEO_VFR = os.getenv("VIDEO_VFR", "false").strip().lower() in ("1", "true", "yes")
+
+
+def get_encoder_profile(name: Optional[str]) -> tuple[str, dict]:
+    """
+    Returns (name, settings) of the requested encoder profile, or of
+    VIDEO_ENCODER_PROFILE when none is requested.
+    """
+    profile_name = name or VIDEO_ENCODER_PROFILE
+    if profile_name not in ENCODER_PROFILES:
+        raise ValueError(
+            f"Unknown encoder profile '{profile_name}'. Available: {', '.join(ENCODER_PROFILES)}")
+    return profile_name, ENCODER_PROFILES[profile_name]
+
+
+def _natural_sort_key(name: str) -> list:
+    """
+    Orders names like `sort -V` does for the text images (text_2 before text_10).
+    """
+    return [int(part) if part.isdigit() else part for part in re.split(r"(\d+)", name)]
+
+
+def _run_with_frames(cmd: list, renderer: CaptionFrameRenderer) -> subprocess.CompletedProcess:
+    """
+    Runs create_vid.sh in frames mode, streaming the rendered frames to its stdin.
+    """
+    with tempfile.TemporaryFile() as stdout_file, tempfile.TemporaryFile() as stderr_file:
+        process = subprocess.Popen(cmd, stdin=subprocess.PIPE,
+                                   stdout=stdout_file, stderr=stderr_file)
+        try:
+            renderer.write_to(process.stdin)
+        except BrokenPipeError:
+            # The script exited early; its exit code and output say why
+            logging.error("create_vid.sh stopped reading frames before the end of the video")
+        except BaseException:
+            process.kill()
+            raise
+        finally:
+            try:
+                process.stdin.close()
+            except BrokenPipeError:
+                pass
+        returncode = process.wait()
+        stdout_file.seek(0)
+        stderr_file.seek(0)
+        return subprocess.CompletedProcess(
+            cmd, returncode,
+            stdout=stdout_file.read().decode("utf-8", errors="replace"),
+            stderr=stderr_file.read().decode("utf-8", errors="replace"))
+
+
+def run_create_vid_script(
+    local_text_dir: str,
+    local_background_path: str,
+    local_output_path: str,
+    video_duration_per_text: float,
+    fade_duration: float,
+    line_thickness: int,
+    line_color: str,
+    gif_width_proportion: float,
+    gif_offset_proportion: float,
+    gif_duration: float,
+    gif_framerate: int,
+    fps: int,
+    encoder_profile: Optional[str] = None,
+    local_music_path: Optional[str] = None,
+    outro_local_path: Optional[str] = None,
+    text_source: Optional[str] = None,
+    background_image: Optional[Image.Image] = None,
+    text_images: Optional[List[TextImage]] = None,
+    vfr: Optional[bool] = None,
+) -> dict:
+    """
+    Runs create_vid.sh on a background and a directory of text PNGs that are
+    already on local disk, and raises if the script fails or produces no output.
+    In the frames pipeline, background_image and text_images (in order) can be
+    given instead, so the rendered captions never have to be written to disk.
+    Returns the encoder profile used, whether the output is variable frame
+    rate (vfr, defaulting to VIDEO_VFR) and the wall time of the encode.
+    """
+    profile_name, profile = get_encoder_profile(encoder_profile)
+    if vfr is None:
+        vfr = VIDEO_VFR
+
+    # Get image dimensions to calculate proportional values
+    if background_image is None:
+        with Image.open(local_background_path) as img:
+            img_width, img_height = img.size
+    else:
+        img_width, img_height = background_image.size
+
+    # Calculate proportional values
+    gif_width = int(img_width * gif_width_proportion)
+    gif_y_offset = int(img_height * gif_offset_proportion)
+
+    # Verify text images exist
+    if text_images is not None:
+        png_files = text_images
+    else:
+        png_files = [f for f in os.listdir(local_text_dir) if f.lower().endswith('.png')]
+    if not png_files:
+        raise FileNotFoundError(
+            f"No text images (.png) found in {text_source or local_text_dir}. Ensure caption images exist in 'text_only'."
+        )
+
+    script_path = os.path.abspath(os.path.join(os.path.dirname(__file__),
+                                               "create_vid.sh"))
+    os.chmod(script_path, 0o755)
+
+    # Preflight dependency checks for clearer errors
+    missing_tools = []
+    if shutil.which('ffprobe') is None:
+        missing_tools.append('ffprobe (from ffmpeg)')
+    if shutil.which('ffmpeg') is None:
+        missing_tools.append('ffmpeg')
+    if missing_tools:
+        raise EnvironmentError(
+            "Missing required tools: " + ", ".join(missing_tools) +
+            ". Please install them (e.g., brew install ffmpeg)."
+        )
+
+    cmd = [
+        script_path,
+        "--text-dir",
+        local_text_dir,
+        "--background",
+        local_background_path,
+        "--output",
+        local_output_path,
+        "--duration-per-text",
+        str(video_duration_per_text),
+        "--fade-duration",
+        str(fade_duration),
+        "--gif-y-offset",
+        str(gif_y_offset),
+        "--gif-width",
+        str(gif_width),
+        "--gif-height",
+        str(line_thickness),
+        "--gif-color",
+        line_color,
+        "--gif-duration",
+        str(gif_duration),
+        "--gif-framerate",
+        str(gif_framerate),
+        "--fps",
+        str(fps),
+        "--preset",
+        profile["preset"],
+        "--crf",
+        str(profile["crf"]),
+        "--tune",
+        profile["tune"],
+        "--gop",
+        str(max(1, round(profile["gop_seconds"] * fps))),
+        "--threads",
+        str(profile["threads"]),
+        "--mode",
+        VIDEO_PIPELINE_MODE,
+        "--single-pass-max-texts",
+        str(VIDEO_SINGLE_PASS_MAX_TEXTS),
+        "--segment-jobs",
+        str(VIDEO_SEGMENT_JOBS),
+        "--segment-threads",
+        str(VIDEO_SEGMENT_THREADS),
+    ]
+    if VIDEO_SEGMENT_CACHE_MAX_BYTES > 0:
+        cmd.extend([
+            "--segment-cache-dir", VIDEO_SEGMENT_CACHE_DIR,
+            "--segment-cache-max-bytes", str(VIDEO_SEGMENT_CACHE_MAX_BYTES)
+        ])
+    if local_music_path:
+        cmd.extend(["--music", local_music_path])
+    if outro_local_path:
+        cmd.extend(["--post-script-video", outro_local_path])
+    if vfr:
+        cmd.append("--vfr")
+
+    renderer = None
+    if VIDEO_PIPELINE_MODE == "frames":
+        if background_image is None:
+            with Image.open(local_background_path) as img:
+                background_image = img.convert("RGBA")
+        if text_images is None:
+            text_images = [os.path.join(local_text_dir, f)
+                           for f in sorted(png_files, key=_natural_sort_key)]
+        renderer = CaptionFrameRenderer(
+            background=background_image,
+            texts=text_images,
+            fps=fps,
+            duration_per_text=video_duration_per_text,
+            fade_duration=fade_duration,
+            line_width=gif_width,
+            line_height=line_thickness,
+            line_color=line_color,
+            line_y_offset=gif_y_offset,
+            line_duration=gif_duration,
+            line_framerate=gif_framerate,
+        )
+        cmd.extend([
+            "--frame-size", f"{renderer.width}x{renderer.height}",
+            "--frame-count", str(renderer.frame_count)
+        ])
+
+    logging.info(
+        f"Executing video generation pipeline ({profile_name} profile, {fps} fps{', VFR' if vfr else ''})")
+    encode_start = time.time()
+    if renderer is None:
+        result = subprocess.run(cmd, capture_output=True, text=True)
+    else:
+        result = _run_with_frames(cmd, renderer)
+    encode_duration = time.time() - encode_start
+
+    if result.returncode != 0:
+        logging.error(
+            f"Script execution failed with code {result.returncode}")
+        logging.error(f"STDOUT: {result.stdout}")
+        logging.error(f"STDERR: {result.stderr}")
+        raise RuntimeError(
+            "Video generation script failed. "
+            f"Exit code: {result.returncode}. "
+            f"STDOUT: {result.stdout.strip()} "
+            f"STDERR: {result.stderr.strip()}"
+        )
+
+    if not os.path.exists(local_output_path):
+        raise FileNotFoundError(
+            f"Output video not found at {local_output_path}.")
+    logging.info(f"Script executed successfully in {encode_duration:.2f} seconds. STDOUT: {result.stdout}")
+    return {"encoder_profile": profile_name, "vfr": vfr, "encode_duration": encode_duration}
+
+
 def generate_video_from_script(
     dropbox_folder_path: str,
     audio_dropbox_path: Optional[str],
@@ -770,206 +1717,135 @@ def generate_video_from_script(
     gif_duration: float,
     gif_framerate: int,
     post_script_video_path: Optional[str],
-):
+    encoder_profile: Optional[str] = None,
+    stage_timings: Optional[dict] = None,
+    vfr: Optional[bool] = None,
+) -> dict:
     """
     Generates a video using the create_vid.sh script.
-    This function is intended to be run in the background.
+    Returns the encoder profile and encode time reported by run_create_vid_script,
+    plus dropbox_video_path when the video was saved. Errors are raised to the caller.
+    If stage_timings is given, the download/encode/upload durations (seconds) are
+    recorded in it as each stage finishes.
     """
+    if stage_timings is None:
+        stage_timings = {}
     with tempfile.TemporaryDirectory() as temp_dir:
-        try:
-            dbx = get_dbx_client_cached()
-
-            # --- 1. Set up paths ---
-            background_img_name = "background.png"
-            text_img_dir_name = "text_images"
-            output_video_name = "generated_video.mp4"
-
-            local_background_path = os.path.join(temp_dir, background_img_name)
-            local_text_dir = os.path.join(temp_dir, text_img_dir_name)
-            os.makedirs(local_text_dir, exist_ok=True)
-            local_output_path = os.path.join(temp_dir, output_video_name)
-            local_music_path = None
+        storage = get_storage()
+
+        # --- 1. Set up paths ---
+        background_img_name = "background.png"
+        text_img_dir_name = "text_images"
+        output_video_name = "generated_video.mp4"
+
+        local_background_path = os.path.join(temp_dir, background_img_name)
+        local_text_dir = os.path.join(temp_dir, text_img_dir_name)
+        os.makedirs(local_text_dir, exist_ok=True)
+        local_output_path = os.path.join(temp_dir, output_video_name)
+        local_music_path = None
+
+        # --- 2. Download files from Dropbox ---
+        # Every download is submitted to the shared download pool up
+        # front; each step below only waits for the files it needs.
+        stage_start = time.time()
+        downloads = get_dropbox_download_executor()
+        dropbox_bg_path = f"{dropbox_folder_path.rstrip('/')}/{background_img_name}"
+        dropbox_text_path = f"{dropbox_folder_path.rstrip('/')}/text_only"
+        logging.info(
+            f"Downloading background from {dropbox_bg_path} to {local_background_path}"
+        )
+        background_future = downloads.submit(storage.get,
+                                             dropbox_bg_path,
+                                             local_background_path,
+                                             reusable=True)
+        logging.info(
+            f"Downloading text images from {dropbox_text_path} to {local_text_dir}"
+        )
+        listing_future = downloads.submit(storage.list, dropbox_text_path)
 
-            # --- 2. Download files from Dropbox ---
-            # Download background image
-            dropbox_bg_path = f"{dropbox_folder_path.rstrip('/')}/{background_img_name}"
+        # Download music if provided
+        music_future = None
+        if audio_dropbox_path:
+            music_filename = os.path.basename(audio_dropbox_path)
+            local_music_path = os.path.join(temp_dir, music_filename)
             logging.info(
-                f"Downloading background from {dropbox_bg_path} to {local_background_path}"
+                f"Downloading music from {audio_dropbox_path} to {local_music_path}"
             )
-            dbx.files_download_to_file(local_background_path, dropbox_bg_path)
+            music_future = downloads.submit(storage.get,
+                                            audio_dropbox_path,
+                                            local_music_path,
+                                            reusable=True)
 
-            # Get image dimensions to calculate proportional values
-            from PIL import Image
-            with Image.open(local_background_path) as img:
-                img_width, img_height = img.size
+        outro_local_path, outro_future = submit_outro_download(
+            post_script_video_path, temp_dir, storage, downloads)
 
-            # Calculate proportional values
-            gif_width = int(img_width * gif_width_proportion)
-            gif_y_offset = int(img_height * gif_offset_proportion)
-
-            # Download text images (handle pagination)
-            dropbox_text_path = f"{dropbox_folder_path.rstrip('/')}/text_only"
-            logging.info(
-                f"Downloading text images from {dropbox_text_path} to {local_text_dir}"
-            )
+        started = [background_future, listing_future, music_future, outro_future]
+        try:
             try:
-                list_folder_result = dbx.files_list_folder(dropbox_text_path)
+                text_names = listing_future.result()
             except Exception as e:
                 logging.error(
-                    f"Failed listing Dropbox folder {dropbox_text_path}: {e}")
+                    f"Failed listing {storage.name} folder {dropbox_text_path}: {e}")
                 raise
-
-            total_entries = []
-            total_entries.extend(list_folder_result.entries)
-            while getattr(list_folder_result, 'has_more', False):
-                list_folder_result = dbx.files_list_folder_continue(
-                    list_folder_result.cursor)
-                total_entries.extend(list_folder_result.entries)
-
-            # Proceed to download files
-
-            for entry in total_entries:
-                if isinstance(entry, dropbox.files.FileMetadata):
-                    dest_path = os.path.join(local_text_dir, entry.name)
-                    # Download each file into the local text image directory
-                    dbx.files_download_to_file(dest_path, entry.path_lower)
-
-            # Verify text images exist
-            png_files = [f for f in os.listdir(local_text_dir) if f.lower().endswith('.png')]
-            if not png_files:
-                raise FileNotFoundError(
-                    f"No text images (.png) found in Dropbox folder '{dropbox_text_path}'. Ensure caption images exist in 'text_only'."
-                )
-
-            # Download music if provided
-            if audio_dropbox_path:
-                music_filename = os.path.basename(audio_dropbox_path)
-                local_music_path = os.path.join(temp_dir, music_filename)
-                logging.info(
-                    f"Downloading music from {audio_dropbox_path} to {local_music_path}"
-                )
-                dbx.files_download_to_file(local_music_path,
-                                           audio_dropbox_path)
-
-            # Optionally list local files in debug builds (omitted in production)
-
-            # --- 3. Execute the video generation script ---
-            script_path = os.path.abspath(os.path.join(os.path.dirname(__file__),
-                                                       "create_vid.sh"))
-            os.chmod(script_path, 0o755)
-
-            # Preflight dependency checks for clearer errors
-            missing_tools = []
-            if shutil.which('ffprobe') is None:
-                missing_tools.append('ffprobe (from ffmpeg)')
-            if shutil.which('ffmpeg') is None:
-                missing_tools.append('ffmpeg')
-            if shutil.which('magick') is None and shutil.which('convert') is None:
-                missing_tools.append('ImageMagick (magick/convert)')
-            if missing_tools:
-                raise EnvironmentError(
-                    "Missing required tools: " + ", ".join(missing_tools) +
-                    ". Please install them (e.g., brew install ffmpeg imagemagick)."
-                )
-
-            cmd = [
-                script_path,
-                "--text-dir",
-                local_text_dir,
-                "--background",
-                local_background_path,
-                "--output",
-                local_output_path,
-                "--duration-per-text",
-                str(video_duration_per_text),
-                "--fade-duration",
-                str(fade_duration),
-                "--gif-y-offset",
-                str(gif_y_offset),
-                "--gif-width",
-                str(gif_width),
-                "--gif-height",
-                str(line_thickness),
-                "--gif-color",
-                line_color,
-                "--gif-duration",
-                str(gif_duration),
-                "--gif-framerate",
-                str(gif_framerate),
+            text_futures = [
+                downloads.submit(storage.get, f"{dropbox_text_path}/{name}",
+                                 os.path.join(local_text_dir, name))
+                for name in text_names
             ]
-            if local_music_path:
-                cmd.extend(["--music", local_music_path])
-
-            # Append outro video:
-            # - If a local path exists, use it
-            # - Otherwise, treat provided string as a Dropbox path and download
-            if post_script_video_path:
-                try:
-                    outro_local_path: Optional[str] = None
-                    provided = post_script_video_path
-                    # Use local file if it exists (absolute or relative)
-                    if os.path.isabs(provided) and os.path.exists(provided):
-                        outro_local_path = provided
-                    elif os.path.exists(provided):
-                        outro_local_path = os.path.abspath(provided)
-                    else:
-                        # Download from Dropbox to temp_dir
-                        outro_name = os.path.basename(provided.rstrip('/')) or "outro.mov"
-                        outro_local_path = os.path.join(temp_dir, outro_name)
-                        logging.info(
-                            f"Downloading outro from Dropbox '{provided}' to '{outro_local_path}'")
-                        dbx.files_download_to_file(outro_local_path, provided)
-
-                    if outro_local_path and os.path.exists(outro_local_path):
-                        cmd.extend(["--post-script-video", outro_local_path])
-                    else:
-                        logging.warning(
-                            f"Post script video not found or failed to download: {post_script_video_path}. Skipping outro.")
-                except Exception as e:
-                    logging.warning(
-                        f"Failed to attach post script video '{post_script_video_path}': {e}")
-
-            logging.info("Executing video generation pipeline")
-            result = subprocess.run(cmd, capture_output=True, text=True)
-
-            if result.returncode != 0:
-                logging.error(
-                    f"Script execution failed with code {result.returncode}")
-                logging.error(f"STDOUT: {result.stdout}")
-                logging.error(f"STDERR: {result.stderr}")
-                raise RuntimeError(
-                    "Video generation script failed. "
-                    f"Exit code: {result.returncode}. "
-                    f"STDOUT: {result.stdout.strip()} "
-                    f"STDERR: {result.stderr.strip()}"
-                )
-
-            # Verify output presence; if missing, try to recover by locating any mp4 in temp_dir
-            if not os.path.exists(local_output_path):
-                raise FileNotFoundError(
-                    f"Output video not found at {local_output_path}.")
-            else:
-                logging.info(
-                    f"Script executed successfully. STDOUT: {result.stdout}")
+            started.extend(text_futures)
+
+            background_future.result()
+            for text_future in text_futures:
+                text_future.result()
+            if music_future is not None:
+                music_future.result()
+            outro_local_path = wait_for_outro(post_script_video_path,
+                                              outro_local_path, outro_future)
+        finally:
+            settle_downloads(started)
+        stage_timings["download"] = time.time() - stage_start
+
+        # --- 3. Execute the video generation script ---
+        stage_start = time.time()
+        result = run_create_vid_script(
+            local_text_dir=local_text_dir,
+            local_background_path=local_background_path,
+            local_output_path=local_output_path,
+            video_duration_per_text=video_duration_per_text,
+            fade_duration=fade_duration,
+            line_thickness=line_thickness,
+            line_color=line_color,
+            gif_width_proportion=gif_width_proportion,
+            gif_offset_proportion=gif_offset_proportion,
+            gif_duration=gif_duration,
+            gif_framerate=gif_framerate,
+            fps=fps,
+            encoder_profile=encoder_profile,
+            vfr=vfr,
+            local_music_path=local_music_path,
+            outro_local_path=outro_local_path,
+            text_source=f"{storage.name} folder '{dropbox_text_path}'",
+        )
+        stage_timings["encode"] = time.time() - stage_start
 
-            # --- 4. Upload generated video to Dropbox ---
-            if save_to_dropbox:
-                dropbox_video_path = f"{dropbox_folder_path.rstrip('/')}/{output_video_name}"
-                logging.info(f"Uploading video to {dropbox_video_path}")
-                upload_to_dropbox(dbx, local_output_path, dropbox_video_path)
-                logging.info("Video upload complete.")
+        # --- 4. Upload generated video to Dropbox ---
+        if save_to_dropbox:
+            stage_start = time.time()
+            dropbox_video_path = f"{dropbox_folder_path.rstrip('/')}/{output_video_name}"
+            logging.info(f"Uploading video to {dropbox_video_path}")
+            storage.put(local_output_path, dropbox_video_path)
+            logging.info("Video upload complete.")
+            stage_timings["upload"] = time.time() - stage_start
+            result["dropbox_video_path"] = dropbox_video_path
 
-        except Exception as e:
-            logging.error(
-                f"An error occurred in the video generation task: {e}",
-                exc_info=True)
+        return result
 
 
 @app.post("/generate-video")
 def generate_video(req: VideoGenerationRequest):
     start_time = time.time()  # Start timing
     try:
-        generate_video_from_script(
+        encode_stats = generate_video_from_script(
             dropbox_folder_path=req.dropbox_folder_path,
             audio_dropbox_path=req.audio_dropbox_path,
             save_to_dropbox=req.save_to_dropbox,
@@ -983,6 +1859,8 @@ def generate_video(req: VideoGenerationRequest):
             gif_duration=req.gif_duration,
             gif_framerate=req.gif_framerate,
             post_script_video_path=req.post_script_video_path,
+            encoder_profile=req.encoder_profile,
+            vfr=req.vfr,
         )
 
         end_time = time.time()  # End timing
@@ -996,12 +1874,9 @@ def generate_video(req: VideoGenerationRequest):
             "message": "Video generation completed successfully.",
             "duration": duration  # Include duration in the response
         }
+        response_data.update(encode_stats)
 
-        if req.save_to_dropbox:
-            video_name = "generated_video.mp4"
-            response_data[
-                "dropbox_video_path"] = f"{req.dropbox_folder_path.rstrip('/')}/{video_name}"
-        else:
+        if not req.save_to_dropbox:
             response_data[
                 "message"] = "Video generation completed. File saved locally but not uploaded to Dropbox."
 
@@ -1013,34 +1888,323 @@ def generate_video(req: VideoGenerationRequest):
                             detail=f"Video generation failed: {str(e)}")
 
 
+# Background video jobs: number run at once, how many may be queued or
+# running before submissions are refused, and how long finished jobs are kept
+VIDEO_JOB_CONCURRENCY = int(os.getenv("VIDEO_JOB_CONCURRENCY", "2"))
+VIDEO_JOB_MAX_PENDING = int(os.getenv("VIDEO_JOB_MAX_PENDING", "100"))
+VIDEO_JOB_STATE_DIR = os.getenv("VIDEO_JOB_STATE_DIR") or os.path.join(
+    tempfile.gettempdir(), "captionate_video_jobs")
+VIDEO_JOB_RETENTION_SECONDS = float(os.getenv("VIDEO_JOB_RETENTION_SECONDS", str(7 * 24 * 3600)))
+# Times a job may be started before a restart gives up on it instead of resuming it
+VIDEO_JOB_MAX_ATTEMPTS = int(os.getenv("VIDEO_JOB_MAX_ATTEMPTS", "3"))
+
+_video_job_queue: Optional[VideoJobQueue] = None
+
+
+def run_video_job(payload: dict, timings: dict) -> dict:
+    """
+    Runs one queued /video-jobs request; stage timings are recorded into timings.
+    """
+    req = VideoGenerationRequest(**payload)
+    return generate_video_from_script(
+        dropbox_folder_path=req.dropbox_folder_path,
+        audio_dropbox_path=req.audio_dropbox_path,
+        save_to_dropbox=req.save_to_dropbox,
+        video_duration_per_text=req.video_duration_per_text,
+        fade_duration=req.fade_duration,
+        line_thickness=req.line_thickness,
+        line_color=req.line_color,
+        fps=req.fps,
+        gif_width_proportion=req.gif_width_proportion,
+        gif_offset_proportion=req.gif_offset_proportion,
+        gif_duration=req.gif_duration,
+        gif_framerate=req.gif_framerate,
+        post_script_video_path=req.post_script_video_path,
+        encoder_profile=req.encoder_profile,
+        vfr=req.vfr,
+        stage_timings=timings,
+    )
+
+
+def start_video_job_queue() -> VideoJobQueue:
+    """
+    Creates the video job queue and resumes jobs left unfinished by a previous run.
+    """
+    global _video_job_queue
+    if _video_job_queue is None:
+        logging.info(
+            f"Starting video job queue with {VIDEO_JOB_CONCURRENCY} workers, state in {VIDEO_JOB_STATE_DIR}.")
+        _video_job_queue = VideoJobQueue(VIDEO_JOB_STATE_DIR,
+                                         run_video_job,
+                                         concurrency=VIDEO_JOB_CONCURRENCY,
+                                         max_pending=VIDEO_JOB_MAX_PENDING,
+                                         retention_seconds=VIDEO_JOB_RETENTION_SECONDS,
+                                         max_attempts=VIDEO_JOB_MAX_ATTEMPTS)
+        _video_job_queue.start()
+    return _video_job_queue
+
+
+def shutdown_video_job_queue() -> None:
+    global _video_job_queue
+    if _video_job_queue is not None:
+        _video_job_queue.shutdown()
+        _video_job_queue = None
+
+
+@app.post("/video-jobs", status_code=202)
+def submit_video_job(req: VideoGenerationRequest):
+    """
+    Queues a /generate-video request and returns its job id straight away.
+    Poll GET /video-jobs/{job_id} for progress and fetch the outcome from
+    GET /video-jobs/{job_id}/result.
+    """
+    try:
+        job = start_video_job_queue().submit(req.model_dump())
+    except JobQueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    return {"job_id": job["job_id"], "status": job["status"]}
+
+
+@app.get("/video-jobs/{job_id}")
+def get_video_job(job_id: str):
+    job = start_video_job_queue().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown video job {job_id}")
+    return job
+
+
+@app.get("/video-jobs/{job_id}/result")
+def get_video_job_result(job_id: str):
+    job = start_video_job_queue().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown video job {job_id}")
+    if job["status"] == JOB_FAILED:
+        raise HTTPException(status_code=500, detail={
+            "message": f"Video generation failed: {job['error']['message']}",
+            "timings": job["timings"],
+        })
+    if job["status"] != JOB_SUCCEEDED:
+        raise HTTPException(status_code=409,
+                            detail=f"Video job {job_id} is still {job['status']}")
+    return {**job["result"], "timings": job["timings"]}
+
+
+@app.get("/stats/video-jobs")
+def video_job_stats():
+    if _video_job_queue is None:
+        return {"running": False}
+    return {**_video_job_queue.stats(), "running": True}
+
+
+def write_caption_images(background_data: dict, results: list,
+                         local_background_path: str, local_text_dir: str) -> int:
+    """
+    Writes rendered caption images to the local layout create_vid.sh expects
+    (background.png plus text_NN_text.png). Returns the number of texts written.
+    """
+    with open(local_background_path, "wb") as f:
+        f.write(base64.b64decode(background_data["background_only_b64"]))
+    written = 0
+    for r in sorted([r for r in results if r.get("success")],
+                    key=lambda x: x.get("index", 0)):
+        text_only_b64 = r.get("text_only")
+        if not isinstance(text_only_b64, str):
+            continue
+        idx = int(r["index"]) + 1
+        with open(os.path.join(local_text_dir, f"text_{idx:02d}_text.png"), "wb") as f:
+            f.write(base64.b64decode(text_only_b64))
+        written += 1
+    return written
+
+
+def raw_text_image(raw: dict) -> Image.Image:
+    """Rebuilds a full-size text-only image from a render worker's raw crop."""
+    text_image = Image.new("RGBA", tuple(raw["size"]), (0, 0, 0, 0))
+    if raw["data"]:
+        text_image.paste(Image.frombytes("RGBA", tuple(raw["crop_size"]), raw["data"]),
+                         tuple(raw["offset"]))
+    return text_image
+
+
+def collect_caption_images(background_data: dict, results: list) -> tuple[Image.Image, list[Image.Image]]:
+    """
+    In-memory counterpart of write_caption_images for the frames pipeline:
+    returns the background and the text images in order, from the images
+    rendered with output_format="raw" (no PNG encode and decode in between).
+    """
+    texts = []
+    for r in sorted([r for r in results if r.get("success")],
+                    key=lambda x: x.get("index", 0)):
+        raw = r.get("text_only_raw")
+        if isinstance(raw, dict):
+            texts.append(raw_text_image(raw))
+    return background_data["background_image"], texts
+
+
+@app.post("/caption-video")
+async def caption_video(req: CaptionVideoRequest):
+    """
+    Renders the caption images and encodes them into a video in one request.
+    The intermediate PNGs stay on local disk (in memory with the frames
+    pipeline); only the final MP4 is uploaded
+    when save_to_dropbox is set, otherwise it is returned in the response.
+    """
+    start_time = time.time()
+    if req.save_to_dropbox and not req.dropbox_dir:
+        raise HTTPException(
+            status_code=400,
+            detail="dropbox_dir is required when save_to_dropbox is true")
+    try:
+        logging.info(f"Received caption-video request: {req}")
+        with tempfile.TemporaryDirectory() as temp_dir:
+            storage = get_storage()
+            downloads = get_dropbox_download_executor()
+
+            local_background_path = os.path.join(temp_dir, "background.png")
+            local_text_dir = os.path.join(temp_dir, "text_images")
+            os.makedirs(local_text_dir, exist_ok=True)
+            output_name = (
+                req.output_filename
+                if req.output_filename and req.output_filename.strip()
+                else "generated_video.mp4"
+            )
+            local_output_path = os.path.join(temp_dir, output_name)
+
+            # Music and outro download while the captions render
+            local_music_path = None
+            music_future = None
+            if req.audio_dropbox_path:
+                local_music_path = os.path.join(
+                    temp_dir, os.path.basename(req.audio_dropbox_path))
+                music_future = downloads.submit(storage.get,
+                                                req.audio_dropbox_path,
+                                                local_music_path,
+                                                reusable=True)
+            outro_local_path, outro_future = submit_outro_download(
+                req.post_script_video_path, temp_dir, storage, downloads)
+
+            try:
+                frames_pipeline = VIDEO_PIPELINE_MODE == "frames"
+                background_data, results = await render_caption_images(
+                    req, output_format="raw" if frames_pipeline else "png")
+                background_image, text_images = None, None
+                if frames_pipeline:
+                    background_image, text_images = await asyncio.to_thread(
+                        collect_caption_images, background_data, results)
+                    written = len(text_images)
+                else:
+                    written = await asyncio.to_thread(write_caption_images,
+                                                      background_data, results,
+                                                      local_background_path,
+                                                      local_text_dir)
+                failed_texts = len(req.texts) - written
+                render_done = time.time()
+
+                if music_future is not None:
+                    await asyncio.wrap_future(music_future)
+                outro_local_path = await asyncio.to_thread(
+                    wait_for_outro, req.post_script_video_path, outro_local_path,
+                    outro_future)
+            finally:
+                await asyncio.to_thread(settle_downloads, [music_future, outro_future])
+
+            encode_stats = await asyncio.to_thread(
+                run_create_vid_script,
+                local_text_dir=local_text_dir,
+                local_background_path=local_background_path,
+                local_output_path=local_output_path,
+                video_duration_per_text=req.video_duration_per_text,
+                fade_duration=req.fade_duration,
+                line_thickness=req.line_thickness,
+                line_color=req.line_color,
+                gif_width_proportion=req.gif_width_proportion,
+                gif_offset_proportion=req.gif_offset_proportion,
+                gif_duration=req.gif_duration,
+                gif_framerate=req.gif_framerate,
+                fps=req.fps,
+                encoder_profile=req.encoder_profile,
+                vfr=req.vfr,
+                local_music_path=local_music_path,
+                outro_local_path=outro_local_path,
+                text_source="the rendered captions",
+                background_image=background_image,
+                text_images=text_images,
+            )
+            duration = time.time() - start_time
+            logging.info(
+                f"Caption video completed in {duration:.2f} seconds "
+                f"(rendering {render_done - start_time:.2f}s).")
+
+            if req.save_to_dropbox:
+                dest = f"{req.dropbox_dir.rstrip('/')}/{output_name}"
+                logging.info(f"Uploading video to {dest}")
+                await asyncio.to_thread(storage.put, local_output_path, dest)
+                message = "Caption video generated and uploaded."
+                if failed_texts:
+                    message += f" {failed_texts} texts failed to render."
+                return {
+                    "message": message,
+                    "dropbox_video_path": dest,
+                    "failed_texts": failed_texts,
+                    "duration": time.time() - start_time,
+                    **encode_stats,
+                }
+
+            # Move the MP4 out of the work dir so it can be streamed from disk
+            # after this block; its dir is removed once the response is sent
+            response_dir = tempfile.mkdtemp(prefix="caption_video_")
+            response_path = os.path.join(response_dir, output_name)
+            os.replace(local_output_path, response_path)
+            return FileResponse(
+                response_path,
+                media_type="video/mp4",
+                filename=output_name,
+                headers={
+                    "X-Encoder-Profile": encode_stats["encoder_profile"],
+                    "X-Encode-Duration": f"{encode_stats['encode_duration']:.3f}",
+                },
+                background=BackgroundTask(shutil.rmtree, response_dir, ignore_errors=True),
+            )
+
+    except ImageFetchError as e:
+        logging.error(f"Error fetching image: {e}")
+        raise HTTPException(
+            status_code=400,
+            detail="Error fetching image from the provided URL.")
+    except Exception as e:
+        logging.error(f"Error in caption_video endpoint: {e}", exc_info=True)
+        raise HTTPException(status_code=500,
+                            detail=f"Caption video generation failed: {e}")
+
+
 @app.post("/attach-outro")
 def attach_outro(req: AttachOutroRequest):
     try:
         with tempfile.TemporaryDirectory() as temp_dir:
-            dbx = get_dbx_client_cached()
+            storage = get_storage()
 
             def resolve_local_or_download(src_path: str, default_name: str) -> str:
                 if os.path.isabs(src_path) and os.path.exists(src_path):
                     return src_path
                 if os.path.exists(src_path):
                     return os.path.abspath(src_path)
-                # Treat as Dropbox path
+                # Treat as a storage path
                 dest = os.path.join(temp_dir, default_name)
                 try:
-                    logging.info(f"Downloading from Dropbox '{src_path}' to '{dest}'")
-                    dbx.files_download_to_file(dest, src_path)
+                    logging.info(f"Downloading from {storage.name} storage '{src_path}' to '{dest}'")
+                    storage.get(src_path, dest)
                     return dest
                 except Exception as e:
                     raise FileNotFoundError(
-                        f"Could not locate '{src_path}' locally and failed to download from Dropbox: {e}")
+                        f"Could not locate '{src_path}' locally and failed to download from {storage.name} storage: {e}")
 
             # Prefer explicit Dropbox paths when provided; ignore local paths in that case
             if req.dropbox_main_video_path and req.dropbox_main_video_path.strip():
                 main_src_dp = req.dropbox_main_video_path.strip()
                 main_local_name = os.path.basename(main_src_dp) or "main.mp4"
                 main_local = os.path.join(temp_dir, main_local_name)
-                logging.info(f"Downloading main video from Dropbox '{main_src_dp}' to '{main_local}'")
-                dbx.files_download_to_file(main_local, main_src_dp)
+                logging.info(f"Downloading main video from {storage.name} storage '{main_src_dp}' to '{main_local}'")
+                storage.get(main_src_dp, main_local)
             else:
                 if not req.main_video_path:
                     raise HTTPException(status_code=400, detail="Either main_video_path or dropbox_main_video_path is required")
@@ -1053,8 +2217,8 @@ def attach_outro(req: AttachOutroRequest):
                 outro_src_dp = req.dropbox_outro_video_path.strip()
                 outro_local_name = os.path.basename(outro_src_dp) or "outro.mov"
                 outro_local = os.path.join(temp_dir, outro_local_name)
-                logging.info(f"Downloading outro video from Dropbox '{outro_src_dp}' to '{outro_local}'")
-                dbx.files_download_to_file(outro_local, outro_src_dp)
+                logging.info(f"Downloading outro video from {storage.name} storage '{outro_src_dp}' to '{outro_local}'")
+                storage.get(outro_src_dp, outro_local, reusable=True)
             else:
                 if not req.outro_video_path:
                     raise HTTPException(status_code=400, detail="Either outro_video_path or dropbox_outro_video_path is required")
@@ -1106,12 +2270,8 @@ def attach_outro(req: AttachOutroRequest):
                         ),
                     )
                 dest = f"{req.dropbox_output_folder.rstrip('/')}/{output_name}"
-                logging.info(f"Uploading result to Dropbox: {dest}")
-                upload_to_dropbox(dbx, local_output_path, dest)
-                try:
-                    link = upload_and_get_link(dbx, local_output_path, dest)
-                except Exception:
-                    link = None
+                logging.info(f"Uploading result to {storage.name} storage: {dest}")
+                _, link = storage.publish(local_output_path, dest)
                 return {
                     "message": "Outro attached and uploaded to Dropbox.",
                     "dropbox_path": dest,
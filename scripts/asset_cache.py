@@ -0,0 +1,138 @@
+import fcntl
+import logging
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+import dropbox
+from dropbox.files import FileMetadata
+
+from scripts.dropbox_utils import dropbox_file_content_hash
+
+logger = logging.getLogger(__name__)
+
+
+@contextmanager
+def _file_lock(lock_path: str):
+    """
+    Holds an exclusive advisory lock on lock_path, shared across processes.
+    Eviction deletes lock files, so a lock taken on a file that was unlinked
+    while waiting is dropped and taken again on the current one.
+    """
+    while True:
+        lock_file = open(lock_path, "a")
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            current = os.stat(lock_path)
+        except FileNotFoundError:
+            current = None
+        if current is not None and current.st_ino == os.fstat(lock_file.fileno()).st_ino:
+            break
+        fcntl.flock(lock_file, fcntl.LOCK_UN)
+        lock_file.close()
+    try:
+        yield
+    finally:
+        fcntl.flock(lock_file, fcntl.LOCK_UN)
+        lock_file.close()
+
+
+class DropboxAssetCache:
+    """
+    Persistent on-disk cache of reusable Dropbox assets (outros, music, backgrounds).
+
+    Files are stored under blobs/ by their Dropbox content_hash, so a cheap
+    files_get_metadata call decides whether the local copy is still current
+    for a given path and rev. Downloads of the same blob are serialized with
+    a per-blob file lock, so several worker processes can share one cache
+    directory. Least recently used blobs are evicted once the size cap is
+    exceeded. Callers get a hard link (or a copy) of the blob, so eviction
+    never removes a file that a job is still reading.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.blob_dir = os.path.join(cache_dir, "blobs")
+        self.lock_dir = os.path.join(cache_dir, "locks")
+        os.makedirs(self.blob_dir, exist_ok=True)
+        os.makedirs(self.lock_dir, exist_ok=True)
+        self.evict_lock_path = os.path.join(cache_dir, ".evict.lock")
+
+    def fetch(self, dbx: dropbox.Dropbox, dropbox_path: str, local_path: str) -> str:
+        """Places the current version of dropbox_path at local_path, downloading only on a cache miss."""
+        md = dbx.files_get_metadata(dropbox_path)
+        if not isinstance(md, FileMetadata) or not md.content_hash:
+            logger.info(f"No content hash for {dropbox_path}; downloading without cache")
+            dbx.files_download_to_file(local_path, dropbox_path)
+            return local_path
+
+        blob_path = os.path.join(self.blob_dir, md.content_hash)
+        with _file_lock(os.path.join(self.lock_dir, md.content_hash + ".lock")):
+            if os.path.exists(blob_path):
+                logger.info(f"Asset cache hit: {dropbox_path} (rev {md.rev})")
+                os.utime(blob_path)
+            else:
+                logger.info(f"Asset cache miss: downloading {dropbox_path} (rev {md.rev})")
+                fd, tmp_path = tempfile.mkstemp(dir=self.blob_dir, prefix=".tmp_")
+                os.close(fd)
+                try:
+                    dbx.files_download_to_file(tmp_path, f"rev:{md.rev}")
+                    if dropbox_file_content_hash(tmp_path) != md.content_hash:
+                        raise RuntimeError(f"Downloaded asset {dropbox_path} does not match its content hash")
+                    os.replace(tmp_path, blob_path)
+                except Exception:
+                    if os.path.exists(tmp_path):
+                        os.unlink(tmp_path)
+                    raise
+            self._materialize(blob_path, local_path)
+
+        self._evict()
+        return local_path
+
+    def _materialize(self, blob_path: str, local_path: str) -> None:
+        if os.path.exists(local_path):
+            os.unlink(local_path)
+        try:
+            os.link(blob_path, local_path)
+        except OSError:
+            shutil.copyfile(blob_path, local_path)
+
+    def _evict(self) -> None:
+        with _file_lock(self.evict_lock_path):
+            blobs = []
+            total = 0
+            for name in os.listdir(self.blob_dir):
+                if name.startswith(".tmp_"):
+                    continue
+                path = os.path.join(self.blob_dir, name)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                blobs.append((st.st_mtime, st.st_size, path))
+                total += st.st_size
+            for _, size, path in sorted(blobs):
+                if total <= self.max_bytes:
+                    break
+                lock_path = os.path.join(self.lock_dir, os.path.basename(path) + ".lock")
+                with open(lock_path, "a") as lock_file:
+                    # Skip blobs another worker is downloading or linking right now
+                    try:
+                        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except BlockingIOError:
+                        continue
+                    try:
+                        os.unlink(path)
+                        total -= size
+                        logger.info(f"Evicted cached asset {os.path.basename(path)} ({size} bytes)")
+                    except FileNotFoundError:
+                        pass
+                    finally:
+                        # Remove the lock file while still holding it; waiters
+                        # notice and lock the new file instead (see _file_lock)
+                        try:
+                            os.unlink(lock_path)
+                        except FileNotFoundError:
+                            pass
+                        fcntl.flock(lock_file, fcntl.LOCK_UN)
@@ -1,8 +1,18 @@
 import dropbox
 import os
+import hashlib
 import logging
-from typing import Optional
-from dropbox.files import WriteMode, FileMetadata, FolderMetadata
+import threading
+from concurrent.futures import Executor
+from typing import Dict, List, Optional, Tuple, Union
+from dropbox.files import (
+    CommitInfo,
+    FileMetadata,
+    FolderMetadata,
+    UploadSessionCursor,
+    UploadSessionFinishArg,
+    WriteMode,
+)
 from dropbox.exceptions import ApiError, AuthError
 import time
 
@@ -35,26 +45,6 @@ def get_dbx_client():
         logger.error(f"Failed to connect to Dropbox: {e}")
         raise ConnectionError("Failed to connect to Dropbox.") from e
 
-def upload_and_get_temporary_link(dbx: dropbox.Dropbox, file_content: bytes, dropbox_path: str) -> Optional[str]:
-    """Uploads a file and returns a temporary link."""
-    try:
-        dbx.files_upload(file_content, dropbox_path, mode=WriteMode('overwrite'))
-        logger.info(f"Successfully uploaded to Dropbox: {dropbox_path}")
-        
-        link_result = dbx.files_get_temporary_link(dropbox_path)
-        if link_result:
-            logger.info(f"Successfully created temporary link for: {dropbox_path}")
-            return link_result.link
-        else:
-            logger.error(f"Failed to get temporary link for {dropbox_path}")
-            return None
-    except ApiError as e:
-        logger.error(f"Dropbox API error when processing {dropbox_path}: {e}")
-        return None
-    except Exception as e:
-        logger.error(f"Failed to upload or get temporary link from Dropbox for {dropbox_path}: {e}")
-        return None
-
 def download_from_dropbox(dbx: dropbox.Dropbox, dropbox_folder_path: str) -> str:
     """Download files from a Dropbox folder path using an initialized client."""
     local_save_path = './downloaded_files'
@@ -81,6 +71,15 @@ def download_from_dropbox(dbx: dropbox.Dropbox, dropbox_folder_path: str) -> str
     download_folder_recursive(dropbox_folder_path, local_save_path)
     return local_save_path
 
+def list_dropbox_folder_files(dbx: dropbox.Dropbox, folder_path: str) -> List[FileMetadata]:
+    """List the files (not subfolders) directly inside a Dropbox folder, following pagination."""
+    result = dbx.files_list_folder(folder_path)
+    entries = list(result.entries)
+    while getattr(result, 'has_more', False):
+        result = dbx.files_list_folder_continue(result.cursor)
+        entries.extend(result.entries)
+    return [entry for entry in entries if isinstance(entry, FileMetadata)]
+
 def download_single_file_from_dropbox(dbx: dropbox.Dropbox, dropbox_file_path: str, local_folder_path: str) -> str:
     """Download a single file from Dropbox."""
     file_name = os.path.basename(dropbox_file_path)
@@ -96,44 +95,205 @@ def download_single_file_from_dropbox(dbx: dropbox.Dropbox, dropbox_file_path: s
             raise FileNotFoundError(f"File not found on Dropbox: {dropbox_file_path}") from err
         raise RuntimeError(f"Error downloading file from Dropbox: {err}") from err
 
-def upload_to_dropbox(dbx: dropbox.Dropbox, local_file_path: str, dropbox_upload_path: str):
-    """Uploads a local file to a specified Dropbox path."""
-    logger.info(f"Attempting to upload {local_file_path} to: {dropbox_upload_path}")
-    
-    with open(local_file_path, "rb") as f:
-        try:
-            dbx.files_upload(f.read(), dropbox_upload_path, mode=WriteMode('overwrite'))
-            logger.info(f"Successfully uploaded {local_file_path} to {dropbox_upload_path}")
-        except ApiError as e:
-            raise RuntimeError(f"Error during Dropbox upload: {e}") from e 
+# Files larger than one chunk are streamed through an upload session
+UPLOAD_CHUNK_SIZE = int(os.getenv("DROPBOX_UPLOAD_CHUNK_SIZE", str(8 * 1024 * 1024)))
 
-def ensure_dropbox_folder(dbx: dropbox.Dropbox, folder_path: str) -> None:
-    """Ensure a Dropbox folder exists (idempotent, creates parents as needed)."""
-    if not folder_path or folder_path == "/":
-        return
-    folder_path = folder_path.rstrip("/")
-    try:
-        md = dbx.files_get_metadata(folder_path)
-        if isinstance(md, FolderMetadata):
-            logger.info(f"Folder exists on Dropbox: {folder_path}")
-            return
-        raise RuntimeError(f"Path exists and is not a folder: {folder_path}")
-    except ApiError as err:
-        if err.error.is_path() and err.error.get_path().is_not_found():
-            parent = os.path.dirname(folder_path)
-            if parent and parent != "/" and parent != folder_path:
-                ensure_dropbox_folder(dbx, parent)
+def _session_correct_offset(err: ApiError) -> Optional[int]:
+    """Returns the server's expected offset if an upload session call failed with incorrect_offset."""
+    error = err.error
+    if hasattr(error, "is_lookup_failed") and error.is_lookup_failed():
+        error = error.get_lookup_failed()
+    if hasattr(error, "is_incorrect_offset") and error.is_incorrect_offset():
+        return error.get_incorrect_offset().correct_offset
+    return None
+
+def upload_to_dropbox(
+    dbx: dropbox.Dropbox,
+    local_file_path: str,
+    dropbox_upload_path: str,
+    chunk_size: Optional[int] = None,
+    retries: int = 3,
+    backoff: float = 1.5,
+) -> FileMetadata:
+    """
+    Uploads a local file to a specified Dropbox path.
+
+    Files up to `chunk_size` go up in a single call; larger files are streamed
+    through an upload session one chunk at a time, so memory use stays at one
+    chunk. A failed chunk is retried from the offset the server expects.
+    """
+    chunk_size = max(1, chunk_size or UPLOAD_CHUNK_SIZE)
+    file_size = os.path.getsize(local_file_path)
+    commit = CommitInfo(path=dropbox_upload_path, mode=WriteMode('overwrite'))
+    logger.info(f"Attempting to upload {local_file_path} to: {dropbox_upload_path} ({file_size} bytes)")
+
+    with open(local_file_path, "rb") as f:
+        cursor: Optional[UploadSessionCursor] = None
+        md: Optional[FileMetadata] = None
+        offset = 0
+        attempt = 1
+        while md is None:
+            f.seek(offset)
+            chunk = f.read(chunk_size)
+            is_last = offset + len(chunk) >= file_size
             try:
-                dbx.files_create_folder_v2(folder_path)
-                logger.info(f"Created Dropbox folder: {folder_path}")
-            except ApiError as create_err:
-                # If another process created it between check and create
-                if create_err.error.is_path() and create_err.error.get_path().is_conflict():
-                    logger.info(f"Folder already created concurrently: {folder_path}")
+                if cursor is None and is_last:
+                    md = dbx.files_upload(chunk, dropbox_upload_path, mode=WriteMode('overwrite'))
+                elif cursor is None:
+                    result = dbx.files_upload_session_start(chunk)
+                    cursor = UploadSessionCursor(session_id=result.session_id, offset=len(chunk))
+                elif is_last:
+                    md = dbx.files_upload_session_finish(chunk, cursor, commit)
                 else:
-                    raise
+                    dbx.files_upload_session_append_v2(chunk, cursor)
+                    cursor.offset += len(chunk)
+                if cursor is not None:
+                    offset = cursor.offset
+                attempt = 1
+            except Exception as e:
+                correct_offset = _session_correct_offset(e) if isinstance(e, ApiError) else None
+                if cursor is not None and correct_offset is not None:
+                    logger.warning(f"Resuming upload of {dropbox_upload_path} at offset {correct_offset} (was {cursor.offset})")
+                    cursor.offset = correct_offset
+                    offset = correct_offset
+                if attempt >= retries:
+                    raise RuntimeError(f"Error during Dropbox upload: {e}") from e
+                sleep_time = backoff ** (attempt - 1)
+                logger.warning(f"Upload chunk at offset {offset} failed for {dropbox_upload_path} (attempt {attempt}/{retries}). Retrying in {sleep_time:.2f}s. Error: {e}")
+                attempt += 1
+                time.sleep(sleep_time)
+
+    verify_uploaded_metadata(md, dropbox_upload_path, file_size)
+    logger.info(f"Successfully uploaded {local_file_path} to {dropbox_upload_path}")
+    return md
+
+def publish_to_dropbox(
+    dbx: dropbox.Dropbox,
+    local_file_path: str,
+    dropbox_upload_path: str,
+    chunk_size: Optional[int] = None,
+) -> Tuple[FileMetadata, Optional[str]]:
+    """
+    Uploads a local file once (streamed via upload_to_dropbox) and returns its
+    metadata together with a temporary link, or None if the link could not be created.
+    """
+    md = upload_to_dropbox(dbx, local_file_path, dropbox_upload_path, chunk_size=chunk_size)
+    try:
+        link = dbx.files_get_temporary_link(dropbox_upload_path).link
+        logger.info(f"Successfully created temporary link for: {dropbox_upload_path}")
+    except Exception as e:
+        logger.error(f"Failed to get temporary link for {dropbox_upload_path}: {e}")
+        link = None
+    return md, link
+
+# Per-process cache of folders known to exist: lower-cased path -> expiry (monotonic seconds)
+FOLDER_CACHE_TTL = float(os.getenv("DROPBOX_FOLDER_CACHE_TTL", "300"))
+_known_folders: Dict[str, float] = {}
+_known_folders_lock = threading.Lock()
+
+def _folder_known(folder_path: str) -> bool:
+    with _known_folders_lock:
+        expiry = _known_folders.get(folder_path.lower())
+        if expiry is None:
+            return False
+        if expiry < time.monotonic():
+            del _known_folders[folder_path.lower()]
+            return False
+        return True
+
+def _remember_folder(folder_path: str) -> None:
+    """Marks a folder and all of its parents as existing."""
+    expiry = time.monotonic() + FOLDER_CACHE_TTL
+    with _known_folders_lock:
+        path = folder_path.lower()
+        while path and path != "/":
+            _known_folders[path] = expiry
+            path = os.path.dirname(path)
+
+def ensure_dropbox_folders(
+    dbx: dropbox.Dropbox,
+    folder_paths: List[str],
+    poll_interval: float = 0.5,
+    poll_timeout: float = 60.0,
+) -> None:
+    """
+    Ensure several Dropbox folders exist with a single create_folder_batch call.
+
+    Folders already in the existence cache are skipped; Dropbox creates missing
+    parents itself, and "already exists" conflicts count as success.
+    """
+    pending = []
+    for folder_path in folder_paths:
+        if not folder_path or folder_path == "/":
+            continue
+        folder_path = folder_path.rstrip("/")
+        if not _folder_known(folder_path) and folder_path not in pending:
+            pending.append(folder_path)
+    if not pending:
+        return
+
+    launch = dbx.files_create_folder_batch(pending)
+    if launch.is_complete():
+        result = launch.get_complete()
+    elif launch.is_async_job_id():
+        job_id = launch.get_async_job_id()
+        deadline = time.monotonic() + poll_timeout
+        while True:
+            status = dbx.files_create_folder_batch_check(job_id)
+            if status.is_complete():
+                result = status.get_complete()
+                break
+            if status.is_failed():
+                raise RuntimeError(f"Dropbox folder batch creation failed: {status.get_failed()}")
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Folder batch job {job_id} did not finish within {poll_timeout}s")
+            time.sleep(poll_interval)
+    else:
+        raise RuntimeError(f"Unexpected folder batch response: {launch}")
+
+    for folder_path, entry in zip(pending, result.entries):
+        if entry.is_success():
+            logger.info(f"Created Dropbox folder: {folder_path}")
         else:
-            raise
+            failure = entry.get_failure()
+            write_error = failure.get_path() if failure.is_path() else None
+            if not (write_error is not None and write_error.is_conflict()
+                    and write_error.get_conflict().is_folder()):
+                raise RuntimeError(f"Failed to create Dropbox folder {folder_path}: {failure}")
+            logger.info(f"Folder exists on Dropbox: {folder_path}")
+        _remember_folder(folder_path)
+
+DROPBOX_HASH_BLOCK_SIZE = 4 * 1024 * 1024
+
+def dropbox_content_hash(content_bytes: bytes) -> str:
+    """Computes Dropbox's content_hash: SHA-256 over the SHA-256 digests of each 4 MiB block."""
+    overall = hashlib.sha256()
+    for start in range(0, len(content_bytes), DROPBOX_HASH_BLOCK_SIZE):
+        overall.update(hashlib.sha256(content_bytes[start:start + DROPBOX_HASH_BLOCK_SIZE]).digest())
+    return overall.hexdigest()
+
+def dropbox_file_content_hash(local_file_path: str) -> str:
+    """Computes Dropbox's content_hash for a local file, reading one 4 MiB block at a time."""
+    overall = hashlib.sha256()
+    with open(local_file_path, "rb") as f:
+        while True:
+            block = f.read(DROPBOX_HASH_BLOCK_SIZE)
+            if not block:
+                break
+            overall.update(hashlib.sha256(block).digest())
+    return overall.hexdigest()
+
+def verify_uploaded_metadata(
+    md: FileMetadata,
+    dropbox_path: str,
+    expected_size: int,
+    expected_hash: Optional[str] = None,
+) -> None:
+    """Checks the FileMetadata returned by an upload against the local size and, optionally, content hash."""
+    if md.size != expected_size:
+        raise RuntimeError(f"Size mismatch after upload to {dropbox_path}: expected {expected_size}, got {md.size}")
+    if expected_hash is not None and md.content_hash and md.content_hash != expected_hash:
+        raise RuntimeError(f"Content hash mismatch after upload to {dropbox_path}")
 
 def upload_bytes(
     dbx: dropbox.Dropbox,
@@ -141,18 +301,17 @@ def upload_bytes(
     dropbox_path: str,
     retries: int = 3,
     backoff: float = 1.5,
-) -> None:
-    """Upload raw bytes to Dropbox with retries and a simple post-upload verification."""
+    verify_hash: bool = True,
+) -> FileMetadata:
+    """Upload raw bytes to Dropbox with retries, verifying the metadata returned by the upload."""
+    expected_hash = dropbox_content_hash(content_bytes) if verify_hash else None
     last_err: Optional[Exception] = None
     for attempt in range(1, max(1, retries) + 1):
         try:
-            dbx.files_upload(content_bytes, dropbox_path, mode=WriteMode("overwrite"))
-            md = dbx.files_get_metadata(dropbox_path)
-            if isinstance(md, FileMetadata) and md.size >= 0:
-                logger.info(f"Uploaded to Dropbox: {dropbox_path} (size={md.size})")
-            else:
-                logger.info(f"Uploaded to Dropbox: {dropbox_path}")
-            return
+            md = dbx.files_upload(content_bytes, dropbox_path, mode=WriteMode("overwrite"))
+            verify_uploaded_metadata(md, dropbox_path, len(content_bytes), expected_hash)
+            logger.info(f"Uploaded to Dropbox: {dropbox_path} (size={md.size})")
+            return md
         except Exception as e:
             last_err = e
             if attempt < retries:
@@ -161,4 +320,119 @@ def upload_bytes(
                 time.sleep(sleep_time)
             else:
                 break
-    raise RuntimeError(f"Failed to upload to Dropbox after {retries} attempts: {dropbox_path}. Last error: {last_err}")
\ No newline at end of file
+    raise RuntimeError(f"Failed to upload to Dropbox after {retries} attempts: {dropbox_path}. Last error: {last_err}")
+
+def _start_closed_upload_session(
+    dbx: dropbox.Dropbox,
+    content_bytes: bytes,
+    dropbox_path: str,
+    retries: int,
+    backoff: float,
+) -> UploadSessionCursor:
+    """Uploads bytes into a new closed upload session, retrying on failure, and returns its cursor."""
+    last_err: Optional[Exception] = None
+    for attempt in range(1, max(1, retries) + 1):
+        try:
+            result = dbx.files_upload_session_start(content_bytes, close=True)
+            return UploadSessionCursor(session_id=result.session_id, offset=len(content_bytes))
+        except Exception as e:
+            last_err = e
+            if attempt < retries:
+                sleep_time = backoff ** (attempt - 1)
+                logger.warning(f"Upload session start failed for {dropbox_path} (attempt {attempt}/{retries}). Retrying in {sleep_time:.2f}s. Error: {e}")
+                time.sleep(sleep_time)
+    raise RuntimeError(f"Failed to start upload session after {retries} attempts: {dropbox_path}. Last error: {last_err}")
+
+# Batch commits contend for the account's write lock; run them one at a time
+_finish_batch_lock = threading.Lock()
+
+def upload_bytes_batch(
+    dbx: dropbox.Dropbox,
+    items: List[Tuple[bytes, str]],
+    executor: Optional[Executor] = None,
+    retries: int = 3,
+    backoff: float = 1.5,
+) -> Dict[str, Optional[str]]:
+    """
+    Uploads many small files and commits them together with upload_session_finish_batch_v2.
+
+    Each file goes into its own closed upload session (started on `executor` when
+    given), then all sessions are committed in one batch call. Dropbox only
+    allows one batch commit at a time per account, so commits from concurrent
+    callers in this process are serialized. Files whose session or commit
+    failed are then uploaded one by one with upload_bytes. Returns a mapping of dropbox_path -> None on success
+    or an error message on failure, in the order of `items`.
+    """
+    outcomes: Dict[str, Optional[str]] = {path: None for _, path in items}
+    contents = {path: content for content, path in items}
+    if not items:
+        return outcomes
+
+    def start(item: Tuple[bytes, str]) -> Union[UploadSessionCursor, Exception]:
+        try:
+            return _start_closed_upload_session(dbx, item[0], item[1], retries, backoff)
+        except Exception as e:
+            return e
+
+    if executor is not None:
+        started = list(executor.map(start, items))
+    else:
+        started = [start(item) for item in items]
+
+    entries = []
+    entry_paths = []
+    for (_, path), cursor in zip(items, started):
+        if isinstance(cursor, Exception):
+            outcomes[path] = str(cursor)
+            logger.error(str(cursor))
+            continue
+        entries.append(UploadSessionFinishArg(
+            cursor=cursor, commit=CommitInfo(path=path, mode=WriteMode("overwrite"))))
+        entry_paths.append(path)
+
+    # A single finish_batch call accepts at most 1000 entries
+    for start_idx in range(0, len(entries), 1000):
+        batch = entries[start_idx:start_idx + 1000]
+        batch_paths = entry_paths[start_idx:start_idx + 1000]
+        try:
+            with _finish_batch_lock:
+                result = dbx.files_upload_session_finish_batch_v2(batch)
+        except Exception as e:
+            logger.error(f"Batch commit of {len(batch)} files failed: {e}")
+            for path in batch_paths:
+                outcomes[path] = f"Batch commit failed: {e}"
+            continue
+
+        for path, entry in zip(batch_paths, result.entries):
+            if entry.is_success():
+                md = entry.get_success()
+                try:
+                    verify_uploaded_metadata(md, path, len(contents[path]), dropbox_content_hash(contents[path]))
+                except RuntimeError as e:
+                    outcomes[path] = str(e)
+                    logger.error(str(e))
+                    continue
+                logger.info(f"Uploaded to Dropbox: {path} (size={md.size})")
+            else:
+                outcomes[path] = f"Commit failed: {entry.get_failure()}"
+                logger.error(f"Failed to commit {path} to Dropbox: {entry.get_failure()}")
+
+    failed = [path for path, error in outcomes.items() if error is not None]
+    if not failed:
+        return outcomes
+    logger.warning(f"Retrying {len(failed)} of {len(items)} batched uploads one by one")
+
+    def upload_single(path: str) -> Optional[str]:
+        try:
+            upload_bytes(dbx, contents[path], path, retries=retries, backoff=backoff)
+            return None
+        except Exception as e:
+            logger.error(str(e))
+            return f"{outcomes[path]}; single upload failed: {e}"
+
+    if executor is not None:
+        retried = list(executor.map(upload_single, failed))
+    else:
+        retried = [upload_single(path) for path in failed]
+    outcomes.update(zip(failed, retried))
+    return outcomes
@@ -0,0 +1,194 @@
+import io
+import logging
+import math
+from typing import BinaryIO, Iterator, List, Optional, Sequence, Tuple, Union
+
+from PIL import Image, ImageColor
+
+logger = logging.getLogger(__name__)
+
+# A text image: a PNG file path, PNG bytes, or an already opened image
+TextImage = Union[str, bytes, Image.Image]
+
+
+def _open_text(text: TextImage) -> Image.Image:
+    if isinstance(text, Image.Image):
+        return text.convert("RGBA")
+    with Image.open(io.BytesIO(text) if isinstance(text, bytes) else text) as img:
+        return img.convert("RGBA")
+
+
+def _line_rgb(color: str) -> Tuple[int, int, int]:
+    """Parses a line color as ffmpeg's color source would (#RRGGBB, 0xRRGGBB or a name)."""
+    if color.lower().startswith("0x"):
+        color = "#" + color[2:]
+    return ImageColor.getrgb(color)[:3]
+
+
+class CaptionFrameRenderer:
+    """
+    Renders the captioned timeline of create_vid.sh as raw RGB24 frames in-process.
+
+    Produces the same picture as the single-pass filter graph: each text image
+    is centered on the background for duration_per_text seconds, fades in and
+    out over fade_duration, and the line grows from the left in line_framerate
+    steps per second, restarting every line_duration. Frames are cropped to
+    even dimensions for the encoder.
+
+    Only the rows covered by the current text change between texts, so the
+    background is converted once and each distinct fade level only blends
+    that band. Consecutive identical frames (holds where the line does not
+    move) reuse the previous frame's bytes. Text images given as paths or
+    PNG bytes are decoded one at a time, when their turn comes.
+    """
+
+    def __init__(
+        self,
+        background: Image.Image,
+        texts: Sequence[TextImage],
+        fps: int,
+        duration_per_text: float,
+        fade_duration: float,
+        line_width: int,
+        line_height: int,
+        line_color: str,
+        line_y_offset: int,
+        line_duration: float,
+        line_framerate: int,
+    ):
+        if not texts:
+            raise ValueError("At least one text image is required")
+        self.fps = fps
+        self.width = background.width // 2 * 2
+        self.height = background.height // 2 * 2
+        self.text_frames = int(round(duration_per_text * fps))
+        self.frame_count = len(texts) * self.text_frames
+        self.stats = {"blended": 0, "drawn": 0, "reused": 0}
+
+        self._background = background.convert("RGBA")
+        self._background_rgb = self._background.crop(
+            (0, 0, self.width, self.height)).convert("RGB").tobytes()
+        self._texts = texts
+        self._fade_factors = self._fade_schedule(duration_per_text, fade_duration)
+
+        # Same stepping as the LINE_FILTER expression in create_vid.sh.
+        # Overlay positions are rounded down to even, as ffmpeg's overlay
+        # filter does for its default yuv420 format.
+        self._line_width = max(1, line_width)
+        self._line_steps = max(1, int(round(line_duration * line_framerate)))
+        self._line_framerate = line_framerate
+        self._line_period = self._line_steps / line_framerate
+        self._line_x = (self.width - self._line_width) // 2 & ~1
+        line_y = (self.height - line_height - line_y_offset) & ~1
+        self._line_rows = [y for y in range(line_y, line_y + line_height)
+                           if 0 <= y < self.height]
+        self._line_pixels = bytes(_line_rgb(line_color)) * self._line_width
+
+    @property
+    def size(self) -> Tuple[int, int]:
+        return self.width, self.height
+
+    def _fade_schedule(self, duration_per_text: float, fade_duration: float) -> List[int]:
+        """Opacity (0-255) of a text on each of its frames, as fade=in then fade=out."""
+        fade_out_start = duration_per_text - fade_duration
+        factors = []
+        for k in range(self.text_frames):
+            t = k / self.fps
+            factor = 1.0
+            if fade_duration > 0:
+                factor *= min(1.0, t / fade_duration)
+                if t >= fade_out_start:
+                    factor *= max(0.0, 1.0 - (t - fade_out_start) / fade_duration)
+            factors.append(int(round(factor * 255)))
+        return factors
+
+    def _line_visible(self, frame_index: int) -> int:
+        t = frame_index / self.fps
+        step = math.floor(math.fmod(t, self._line_period) * self._line_framerate + 0.000001)
+        return min(self._line_width,
+                   (step + 1) * self._line_width // self._line_steps + 1)
+
+    def _text_band(self, text: TextImage) -> Optional[Tuple[int, int, Image.Image]]:
+        """
+        Places a text image centered on the frame and returns the rows it
+        covers as (top, bottom, full-width RGBA layer), or None if it is empty.
+        """
+        text = _open_text(text)
+        bbox = text.getchannel("A").getbbox()
+        if bbox is None:
+            return None
+        x = (self._background.width - text.width) // 2 & ~1
+        y = (self._background.height - text.height) // 2 & ~1
+        top = max(0, y + bbox[1])
+        bottom = min(self.height, y + bbox[3])
+        if top >= bottom:
+            return None
+        layer = Image.new("RGBA", (self.width, bottom - top), (0, 0, 0, 0))
+        layer.paste(text, (x, y - top))
+        return top, bottom, layer
+
+    def _blend_band(self, top: int, bottom: int, layer: Image.Image, opacity: int) -> bytes:
+        """Returns the full frame with the text layer blended at the given opacity."""
+        if opacity <= 0:
+            return self._background_rgb
+        if opacity < 255:
+            layer = layer.copy()
+            layer.putalpha(layer.getchannel("A").point(
+                lambda a: (a * opacity + 127) // 255))
+        band = self._background.crop((0, top, self.width, bottom))
+        band.alpha_composite(layer)
+        self.stats["blended"] += 1
+        row_bytes = self.width * 3
+        return (self._background_rgb[:top * row_bytes] + band.convert("RGB").tobytes() +
+                self._background_rgb[bottom * row_bytes:])
+
+    def _draw_line(self, base: bytes, visible: int) -> bytearray:
+        frame = bytearray(base)
+        row_bytes = self.width * 3
+        start = max(0, self._line_x)
+        end = min(self.width, self._line_x + visible)
+        if end > start:
+            pixels = self._line_pixels[(start - self._line_x) * 3:(end - self._line_x) * 3]
+            for y in self._line_rows:
+                offset = y * row_bytes + start * 3
+                frame[offset:offset + len(pixels)] = pixels
+        self.stats["drawn"] += 1
+        return frame
+
+    def frames(self) -> Iterator[bytes]:
+        """Yields every frame of the timeline in order, as RGB24 bytes."""
+        previous_key = None
+        previous_frame = b""
+        for text_index, text in enumerate(self._texts):
+            band = self._text_band(text)
+            # Only the fully faded-in text is worth keeping: it backs every
+            # hold frame, while each fade level is used once or twice
+            hold = None
+            for k, opacity in enumerate(self._fade_factors):
+                frame_index = text_index * self.text_frames + k
+                visible = self._line_visible(frame_index)
+                key = (text_index, opacity, visible)
+                if key == previous_key:
+                    self.stats["reused"] += 1
+                    yield previous_frame
+                    continue
+                if band is None:
+                    base = self._background_rgb
+                elif opacity == 255:
+                    if hold is None:
+                        hold = self._blend_band(*band, opacity)
+                    base = hold
+                else:
+                    base = self._blend_band(*band, opacity)
+                previous_key = key
+                previous_frame = self._draw_line(base, visible)
+                yield previous_frame
+
+    def write_to(self, stream: BinaryIO) -> None:
+        """Writes every frame to stream, e.g. the stdin of an ffmpeg rawvideo input."""
+        for frame in self.frames():
+            stream.write(frame)
+        logger.info(
+            f"Rendered {self.frame_count} frames at {self.width}x{self.height}: "
+            f"{self.stats['blended']} blends, {self.stats['drawn']} drawn, "
+            f"{self.stats['reused']} reused")
@@ -0,0 +1,181 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import tempfile
+from typing import Optional
+
+from scripts.image_fetch import ImageFetcher
+
+logger = logging.getLogger(__name__)
+
+
+def _atomic_write(path: str, data: bytes) -> None:
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp_")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except Exception:
+        try:
+            os.unlink(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+class ImageCache:
+    """
+    Content-addressed on-disk cache of fetched image bytes.
+
+    Bodies are stored once per SHA-256 under blobs/, and each URL gets a small
+    entry under entries/ with the blob hash and its ETag/Last-Modified
+    validators. Cached URLs are revalidated with a conditional GET. Least
+    recently used blobs are evicted once the byte budget is exceeded, and
+    concurrent requests for the same URL share a single in-flight download.
+    """
+
+    def __init__(self, fetcher: ImageFetcher, cache_dir: str, max_bytes: int):
+        self.fetcher = fetcher
+        self.max_bytes = max_bytes
+        self.blob_dir = os.path.join(cache_dir, "blobs")
+        self.entry_dir = os.path.join(cache_dir, "entries")
+        os.makedirs(self.blob_dir, exist_ok=True)
+        os.makedirs(self.entry_dir, exist_ok=True)
+        self._inflight: dict[str, asyncio.Task] = {}
+        self.stats = {"revalidated": 0, "misses": 0, "coalesced": 0, "evictions": 0}
+
+    def _entry_path(self, url: str) -> str:
+        return os.path.join(self.entry_dir,
+                            hashlib.sha256(url.encode("utf-8")).hexdigest() + ".json")
+
+    def _blob_path(self, content_hash: str) -> str:
+        return os.path.join(self.blob_dir, content_hash)
+
+    def _load_cached(self, url: str) -> tuple[Optional[dict], Optional[bytes]]:
+        try:
+            with open(self._entry_path(url), "r") as f:
+                entry = json.load(f)
+            with open(self._blob_path(entry["content_hash"]), "rb") as f:
+                body = f.read()
+        except (FileNotFoundError, ValueError, KeyError):
+            return None, None
+        if hashlib.sha256(body).hexdigest() != entry["content_hash"]:
+            logger.warning(f"Discarding corrupt cached image for {url}")
+            return None, None
+        return entry, body
+
+    def _touch(self, content_hash: str) -> None:
+        try:
+            os.utime(self._blob_path(content_hash))
+        except FileNotFoundError:
+            pass
+
+    def _store(self, url: str, body: bytes, etag: Optional[str],
+               last_modified: Optional[str]) -> None:
+        content_hash = hashlib.sha256(body).hexdigest()
+        blob_path = self._blob_path(content_hash)
+        if os.path.exists(blob_path):
+            self._touch(content_hash)
+        else:
+            _atomic_write(blob_path, body)
+        entry = {
+            "url": url,
+            "content_hash": content_hash,
+            "size": len(body),
+            "etag": etag,
+            "last_modified": last_modified,
+        }
+        _atomic_write(self._entry_path(url), json.dumps(entry).encode("utf-8"))
+        self._evict()
+
+    def _evict(self) -> None:
+        blobs = []
+        total = 0
+        for name in os.listdir(self.blob_dir):
+            if name.startswith(".tmp_"):
+                continue
+            path = os.path.join(self.blob_dir, name)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            blobs.append((st.st_mtime, st.st_size, path))
+            total += st.st_size
+        if total <= self.max_bytes:
+            return
+        evicted = set()
+        for _, size, path in sorted(blobs):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.unlink(path)
+                total -= size
+                evicted.add(os.path.basename(path))
+                self.stats["evictions"] += 1
+                logger.info(f"Evicted cached image blob {os.path.basename(path)} ({size} bytes)")
+            except FileNotFoundError:
+                pass
+        if evicted:
+            self._drop_entries(evicted)
+
+    def _drop_entries(self, content_hashes: set) -> None:
+        """Removes the URL entries that point at any of the given blobs."""
+        for name in os.listdir(self.entry_dir):
+            if name.startswith(".tmp_"):
+                continue
+            path = os.path.join(self.entry_dir, name)
+            try:
+                with open(path, "r") as f:
+                    content_hash = json.load(f).get("content_hash")
+            except (FileNotFoundError, ValueError):
+                continue
+            if content_hash in content_hashes:
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+
+    async def _fetch(self, url: str) -> bytes:
+        entry, cached_body = await asyncio.to_thread(self._load_cached, url)
+        headers = {}
+        if entry is not None:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+
+        response, body = await self.fetcher.fetch(url, headers=headers or None)
+        if response.status_code == 304 and entry is not None and cached_body is not None:
+            self.stats["revalidated"] += 1
+            await asyncio.to_thread(self._touch, entry["content_hash"])
+            logger.info(f"Image cache revalidated: {url}")
+            return cached_body
+
+        self.stats["misses"] += 1
+        await asyncio.to_thread(self._store, url, body,
+                                response.headers.get("ETag"),
+                                response.headers.get("Last-Modified"))
+        return body
+
+    async def get(self, url: str) -> bytes:
+        """Returns the image bytes for a URL, from cache when still valid."""
+        task = self._inflight.get(url)
+        if task is not None:
+            self.stats["coalesced"] += 1
+        else:
+            # The download runs as its own task and every caller only waits on
+            # it, so a cancelled caller does not cancel it for the others
+            task = asyncio.get_running_loop().create_task(self._fetch(url))
+            self._inflight[url] = task
+            task.add_done_callback(lambda done: self._fetch_done(url, done))
+        return await asyncio.shield(task)
+
+    def _fetch_done(self, url: str, task: asyncio.Task) -> None:
+        if self._inflight.get(url) is task:
+            del self._inflight[url]
+        # Retrieve the exception so it is not reported as never retrieved
+        # when every caller was cancelled before the download finished
+        if not task.cancelled():
+            task.exception()
@@ -0,0 +1,78 @@
+import asyncio
+import logging
+from typing import Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HEADERS = {
+    "User-Agent":
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+}
+
+
+class ImageFetchError(Exception):
+    """Raised when a source image cannot be fetched (network, HTTP status, timeout or size limit)."""
+
+
+class ImageFetcher:
+    """Async HTTP fetcher with a shared keep-alive connection pool and per-host concurrency limits."""
+
+    def __init__(
+        self,
+        connect_timeout: float = 5.0,
+        read_timeout: float = 30.0,
+        max_bytes: int = 50 * 1024 * 1024,
+        max_connections: int = 20,
+        max_per_host: int = 4,
+    ):
+        self.max_bytes = max_bytes
+        self.max_per_host = max(1, max_per_host)
+        self._host_semaphores: dict[str, asyncio.Semaphore] = {}
+        self.client = httpx.AsyncClient(
+            headers=DEFAULT_HEADERS,
+            follow_redirects=True,
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            limits=httpx.Limits(max_connections=max_connections,
+                                max_keepalive_connections=max_connections),
+        )
+
+    def _semaphore_for(self, url: str) -> asyncio.Semaphore:
+        host = urlsplit(url).netloc.lower()
+        semaphore = self._host_semaphores.get(host)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.max_per_host)
+            self._host_semaphores[host] = semaphore
+        return semaphore
+
+    async def fetch(self, url: str, headers: Optional[dict] = None) -> tuple[httpx.Response, bytes]:
+        """Fetches a URL and returns the response and its body, enforcing the size limit."""
+        async with self._semaphore_for(url):
+            try:
+                async with self.client.stream("GET", url, headers=headers) as response:
+                    # 304 is only returned to conditional requests from the image cache
+                    if response.status_code != 304:
+                        response.raise_for_status()
+                    declared = response.headers.get("Content-Length")
+                    if declared and declared.isdigit() and int(declared) > self.max_bytes:
+                        raise ImageFetchError(
+                            f"Image at {url} is {declared} bytes, above the {self.max_bytes} byte limit")
+                    body = bytearray()
+                    async for chunk in response.aiter_bytes():
+                        body.extend(chunk)
+                        if len(body) > self.max_bytes:
+                            raise ImageFetchError(
+                                f"Image at {url} exceeds the {self.max_bytes} byte limit")
+                    return response, bytes(body)
+            except (httpx.HTTPError, httpx.InvalidURL) as e:
+                raise ImageFetchError(f"Error fetching {url}: {e}") from e
+
+    async def fetch_bytes(self, url: str) -> bytes:
+        """Fetches a URL and returns its body."""
+        _, body = await self.fetch(url)
+        return body
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
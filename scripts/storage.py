@@ -0,0 +1,175 @@
+import logging
+import os
+import shutil
+import tempfile
+from abc import ABC, abstractmethod
+from concurrent.futures import Executor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import dropbox
+
+from scripts.asset_cache import DropboxAssetCache
+from scripts.dropbox_utils import (
+    ensure_dropbox_folders,
+    list_dropbox_folder_files,
+    publish_to_dropbox,
+    upload_bytes_batch,
+    upload_to_dropbox,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class StorageBackend(ABC):
+    """
+    Where the endpoints read their inputs from and write their outputs to.
+
+    Paths are POSIX-style and absolute within the backend (e.g. "/n8n/job/9_16/background.png").
+    """
+
+    name = "base"
+
+    @abstractmethod
+    def list(self, folder_path: str) -> List[str]:
+        """Returns the names of the files (not subfolders) directly inside folder_path."""
+
+    @abstractmethod
+    def get(self, path: str, local_path: str, reusable: bool = False) -> str:
+        """Copies the file at path to local_path. `reusable` marks assets worth caching across jobs."""
+
+    @abstractmethod
+    def put(self, local_path: str, path: str) -> None:
+        """Stores a local file at path, overwriting any existing file."""
+
+    @abstractmethod
+    def publish(self, local_path: str, path: str) -> Tuple[Any, Optional[str]]:
+        """Stores a local file at path and returns (backend metadata, read link or None)."""
+
+    @abstractmethod
+    def put_many(self, items: List[Tuple[bytes, str]]) -> Dict[str, Optional[str]]:
+        """Stores (content, path) pairs; returns path -> None on success or an error message."""
+
+    @abstractmethod
+    def ensure_dir(self, folder_paths: List[str]) -> None:
+        """Makes sure the given folders exist."""
+
+    @abstractmethod
+    def link(self, path: str) -> Optional[str]:
+        """Returns a URL for reading the file at path, or None if one cannot be made."""
+
+
+class DropboxStorage(StorageBackend):
+    """Storage backed by a Dropbox account, through the helpers in scripts/dropbox_utils.py."""
+
+    name = "dropbox"
+
+    def __init__(
+        self,
+        client_factory: Callable[[], dropbox.Dropbox],
+        upload_executor: Optional[Executor] = None,
+        asset_cache: Optional[DropboxAssetCache] = None,
+    ):
+        self._client_factory = client_factory
+        self.upload_executor = upload_executor
+        self.asset_cache = asset_cache
+
+    @property
+    def dbx(self) -> dropbox.Dropbox:
+        return self._client_factory()
+
+    def list(self, folder_path: str) -> List[str]:
+        return [entry.name for entry in list_dropbox_folder_files(self.dbx, folder_path)]
+
+    def get(self, path: str, local_path: str, reusable: bool = False) -> str:
+        if reusable and self.asset_cache is not None:
+            return self.asset_cache.fetch(self.dbx, path, local_path)
+        self.dbx.files_download_to_file(local_path, path)
+        return local_path
+
+    def put(self, local_path: str, path: str) -> None:
+        upload_to_dropbox(self.dbx, local_path, path)
+
+    def publish(self, local_path: str, path: str) -> Tuple[Any, Optional[str]]:
+        return publish_to_dropbox(self.dbx, local_path, path)
+
+    def put_many(self, items: List[Tuple[bytes, str]]) -> Dict[str, Optional[str]]:
+        return upload_bytes_batch(self.dbx, items, executor=self.upload_executor)
+
+    def ensure_dir(self, folder_paths: List[str]) -> None:
+        ensure_dropbox_folders(self.dbx, folder_paths)
+
+    def link(self, path: str) -> Optional[str]:
+        try:
+            return self.dbx.files_get_temporary_link(path).link
+        except Exception as e:
+            logger.error(f"Failed to get temporary link for {path}: {e}")
+            return None
+
+
+class LocalStorage(StorageBackend):
+    """Storage in a local (or NFS-mounted) directory, for benchmarks and load tests without Dropbox."""
+
+    name = "local"
+
+    def __init__(self, root_dir: str):
+        self.root_dir = os.path.abspath(root_dir)
+        os.makedirs(self.root_dir, exist_ok=True)
+
+    def _resolve(self, path: str) -> str:
+        resolved = os.path.abspath(os.path.join(self.root_dir, path.lstrip("/")))
+        if resolved != self.root_dir and not resolved.startswith(self.root_dir + os.sep):
+            raise ValueError(f"Path escapes the storage root: {path}")
+        return resolved
+
+    def list(self, folder_path: str) -> List[str]:
+        folder = self._resolve(folder_path)
+        return sorted(name for name in os.listdir(folder)
+                      if os.path.isfile(os.path.join(folder, name)))
+
+    def get(self, path: str, local_path: str, reusable: bool = False) -> str:
+        source = self._resolve(path)
+        if not os.path.isfile(source):
+            raise FileNotFoundError(f"File not found in local storage: {path}")
+        shutil.copyfile(source, local_path)
+        return local_path
+
+    def _write_atomic(self, destination: str, write: Callable[[str], None]) -> None:
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(destination), prefix=".tmp_")
+        os.close(fd)
+        try:
+            write(tmp_path)
+            os.replace(tmp_path, destination)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+    def put(self, local_path: str, path: str) -> None:
+        self._write_atomic(self._resolve(path), lambda tmp: shutil.copyfile(local_path, tmp))
+        logger.info(f"Stored {local_path} at {path} in local storage")
+
+    def publish(self, local_path: str, path: str) -> Tuple[Any, Optional[str]]:
+        self.put(local_path, path)
+        return os.stat(self._resolve(path)), self.link(path)
+
+    def put_many(self, items: List[Tuple[bytes, str]]) -> Dict[str, Optional[str]]:
+        outcomes: Dict[str, Optional[str]] = {}
+        for content, path in items:
+            def write(tmp: str, content: bytes = content) -> None:
+                with open(tmp, "wb") as f:
+                    f.write(content)
+            try:
+                self._write_atomic(self._resolve(path), write)
+                outcomes[path] = None
+            except Exception as e:
+                outcomes[path] = str(e)
+                logger.error(f"Failed to store {path} in local storage: {e}")
+        return outcomes
+
+    def ensure_dir(self, folder_paths: List[str]) -> None:
+        for folder_path in folder_paths:
+            os.makedirs(self._resolve(folder_path), exist_ok=True)
+
+    def link(self, path: str) -> Optional[str]:
+        return "file://" + self._resolve(path)
@@ -0,0 +1,247 @@
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+
+
+class JobQueueFull(Exception):
+    """Raised when a job is submitted while the queue already holds its maximum of pending jobs."""
+
+
+class VideoJobQueue:
+    """
+    Runs long video jobs on a bounded thread pool and tracks them by job id.
+
+    Each job is a JSON file under state_dir with its request payload, status,
+    per-stage timings, result and error details, rewritten atomically on every
+    transition. Finished jobs stay queryable for retention_seconds; older ones
+    are pruned whenever a job is submitted or finishes. On start the directory
+    is reloaded, and jobs that were queued or running when the previous
+    process stopped are queued again, unless they have already been started
+    max_attempts times (a job that keeps taking the process down
+    with it is failed instead of retried forever). A state directory belongs
+    to a single server process.
+
+    The runner is called as runner(payload, timings) and returns the job's
+    result; it may record stage durations (seconds) in the timings dict while
+    it runs.
+    """
+
+    def __init__(
+        self,
+        state_dir: str,
+        runner: Callable[[dict, Dict[str, float]], dict],
+        concurrency: int = 2,
+        max_pending: int = 100,
+        retention_seconds: float = 7 * 24 * 3600,
+        max_attempts: int = 3,
+    ):
+        self.state_dir = state_dir
+        self.runner = runner
+        self.concurrency = max(1, concurrency)
+        self.max_pending = max_pending
+        self.retention_seconds = retention_seconds
+        self.max_attempts = max(1, max_attempts)
+        os.makedirs(self.state_dir, exist_ok=True)
+        self._jobs: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._stopping = False
+
+    def _job_path(self, job_id: str) -> str:
+        return os.path.join(self.state_dir, f"{job_id}.json")
+
+    def _persist(self, job: dict) -> None:
+        fd, tmp_path = tempfile.mkstemp(dir=self.state_dir, prefix=".tmp_")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(job, f)
+            os.replace(tmp_path, self._job_path(job["job_id"]))
+        except Exception:
+            try:
+                os.unlink(tmp_path)
+            except FileNotFoundError:
+                pass
+            raise
+
+    def start(self) -> None:
+        """Loads persisted jobs, drops expired ones and resumes unfinished ones."""
+        if self._executor is not None:
+            return
+        self._stopping = False
+        self._executor = ThreadPoolExecutor(max_workers=self.concurrency,
+                                            thread_name_prefix="video-job")
+        now = time.time()
+        resumed = []
+        for name in sorted(os.listdir(self.state_dir)):
+            if not name.endswith(".json") or name.startswith(".tmp_"):
+                continue
+            path = os.path.join(self.state_dir, name)
+            try:
+                with open(path, "r") as f:
+                    job = json.load(f)
+                job_id = job["job_id"]
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning(f"Skipping unreadable job state {name}: {e}")
+                continue
+            finished_at = job.get("finished_at")
+            if finished_at and now - finished_at > self.retention_seconds:
+                os.unlink(path)
+                continue
+            if job["status"] in (JOB_QUEUED, JOB_RUNNING) and job.get("attempts", 0) >= self.max_attempts:
+                logger.error(f"Video job {job_id} was interrupted {job['attempts']} times; marking it failed")
+                job["status"] = JOB_FAILED
+                job["finished_at"] = now
+                job["error"] = {
+                    "type": "Interrupted",
+                    "message": f"Job was interrupted too many times ({job['attempts']} attempts)",
+                    "traceback": None,
+                }
+                self._persist(job)
+            elif job["status"] in (JOB_QUEUED, JOB_RUNNING):
+                if job["status"] == JOB_RUNNING:
+                    logger.warning(f"Video job {job_id} was interrupted by a restart; queuing it again")
+                job["status"] = JOB_QUEUED
+                job["started_at"] = None
+                job["timings"] = {}
+                self._persist(job)
+                resumed.append(job)
+            self._jobs[job_id] = job
+        for job in sorted(resumed, key=lambda j: j["created_at"]):
+            self._executor.submit(self._run, job["job_id"])
+        if resumed:
+            logger.info(f"Resumed {len(resumed)} unfinished video jobs")
+
+    def shutdown(self) -> None:
+        """
+        Stops accepting work without waiting for running jobs; anything not
+        finished stays persisted and is resumed by the next start().
+        """
+        self._stopping = True
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _prune_expired(self, now: float) -> None:
+        """Forgets finished jobs older than retention_seconds. Called with the lock held."""
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job["finished_at"] and now - job["finished_at"] > self.retention_seconds]
+        for job_id in expired:
+            del self._jobs[job_id]
+            try:
+                os.unlink(self._job_path(job_id))
+            except FileNotFoundError:
+                pass
+        if expired:
+            logger.info(f"Pruned {len(expired)} expired video jobs")
+
+    def _pending_count(self) -> int:
+        return sum(1 for job in self._jobs.values()
+                   if job["status"] in (JOB_QUEUED, JOB_RUNNING))
+
+    def submit(self, payload: dict) -> dict:
+        """Queues a job for payload and returns its public view."""
+        if self._executor is None:
+            raise RuntimeError("Video job queue is not running")
+        job_id = uuid.uuid4().hex
+        job = {
+            "job_id": job_id,
+            "status": JOB_QUEUED,
+            "payload": payload,
+            "created_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+            "attempts": 0,
+            "timings": {},
+            "result": None,
+            "error": None,
+        }
+        with self._lock:
+            self._prune_expired(job["created_at"])
+            if self._pending_count() >= self.max_pending:
+                raise JobQueueFull(
+                    f"{self.max_pending} video jobs are already pending; try again later")
+            self._jobs[job_id] = job
+            self._persist(job)
+        self._executor.submit(self._run, job_id)
+        logger.info(f"Queued video job {job_id}")
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[dict]:
+        """
+        Returns a snapshot of the job for API clients, or None if unknown. The
+        payload and the error traceback are left out; the traceback is only
+        kept in the log and the persisted state.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            view = {k: v for k, v in job.items() if k != "payload"}
+            view["timings"] = dict(job["timings"])
+            if job["error"] is not None:
+                view["error"] = {k: v for k, v in job["error"].items() if k != "traceback"}
+            return view
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = {JOB_QUEUED: 0, JOB_RUNNING: 0, JOB_SUCCEEDED: 0, JOB_FAILED: 0}
+            for job in self._jobs.values():
+                counts[job["status"]] = counts.get(job["status"], 0) + 1
+        return {"jobs": counts, "concurrency": self.concurrency, "max_pending": self.max_pending,
+                "max_attempts": self.max_attempts}
+
+    def _run(self, job_id: str) -> None:
+        with self._lock:
+            job = self._jobs[job_id]
+            job["status"] = JOB_RUNNING
+            job["started_at"] = time.time()
+            job["attempts"] += 1
+            job["timings"]["queued"] = job["started_at"] - job["created_at"]
+            self._persist(job)
+            payload = job["payload"]
+            timings = job["timings"]
+        logger.info(f"Starting video job {job_id}")
+
+        try:
+            result = self.runner(payload, timings)
+            status, error = JOB_SUCCEEDED, None
+        except Exception as e:
+            logger.error(f"Video job {job_id} failed: {e}", exc_info=True)
+            result = None
+            status = JOB_FAILED
+            error = {
+                "type": type(e).__name__,
+                "message": str(e),
+                "traceback": traceback.format_exc(limit=5),
+            }
+
+        with self._lock:
+            if status == JOB_FAILED and self._stopping:
+                # Most likely failed because the shared pools were torn down
+                # underneath it; leave it for the next start() instead.
+                job["status"] = JOB_QUEUED
+                self._persist(job)
+                logger.warning(f"Video job {job_id} interrupted by shutdown; it will be resumed on restart")
+                return
+            job["status"] = status
+            job["finished_at"] = time.time()
+            job["timings"]["total"] = job["finished_at"] - job["started_at"]
+            job["result"] = result
+            job["error"] = error
+            self._persist(job)
+            self._prune_expired(job["finished_at"])
+        logger.info(f"Video job {job_id} {status} in {job['timings']['total']:.2f} seconds")
@@ -0,0 +1,54 @@
+import pytest
+from PIL import Image, ImageDraw
+
+import main
+
+
+def _threshold_layout(threshold):
+    """Layout function that fits every size up to threshold, like a real text does."""
+    return lambda font_size: [font_size] if font_size <= threshold else None
+
+
+@pytest.mark.parametrize("max_font_size", [1, 2, 7, 64, 200])
+def test_bisect_matches_linear_for_every_threshold_and_hint(max_font_size):
+    for threshold in range(0, max_font_size + 2):
+        layout_at_size = _threshold_layout(threshold)
+        expected = main._fit_font_size(layout_at_size, max_font_size, strategy="linear")
+        assert main._fit_font_size(layout_at_size, max_font_size, strategy="bisect") == expected
+        for hint in (-3, 0, 1, threshold - 1, threshold, threshold + 1, max_font_size, max_font_size + 5):
+            assert main._fit_font_size(layout_at_size, max_font_size,
+                                       strategy="bisect", hint=hint) == expected
+
+
+@pytest.mark.parametrize("text", [
+    "Octopuses have <b>three hearts</b> that pump blue blood through their bodies.",
+    "Short",
+    "Line one<br><i>line two</i><br><b><i>line three is a bit longer than the rest</i></b>",
+])
+@pytest.mark.parametrize("width,height", [(1080, 760), (360, 180), (200, 40)])
+def test_bisect_matches_linear_on_real_layouts(text, width, height):
+    draw = ImageDraw.Draw(Image.new("RGBA", (width, height)))
+    logical_lines = main.parse_html_text(text)
+
+    def layout_at_size(font_size):
+        return main._layout_lines_at_font_size(draw, logical_lines, "Montserrat",
+                                               font_size, width - 20, height - 20)
+
+    max_font_size = max(1, min(height, width, 200))
+    expected_size, expected_layout = main._fit_font_size(layout_at_size, max_font_size,
+                                                         strategy="linear")
+    for hint in (None, 1, expected_size, expected_size + 1, max_font_size):
+        size, layout = main._fit_font_size(layout_at_size, max_font_size,
+                                           strategy="bisect", hint=hint)
+        assert size == expected_size
+        assert layout == expected_layout
+
+
+def test_font_size_hints_are_bounded(monkeypatch):
+    monkeypatch.setattr(main, "FONT_FIT_HINT_MAX_ENTRIES", 3)
+    monkeypatch.setattr(main, "_last_fitted_font_size", type(main._last_fitted_font_size)())
+    for i in range(5):
+        main._remember_font_size_hint(("Montserrat", i), 10 + i)
+    assert len(main._last_fitted_font_size) == 3
+    assert main._get_font_size_hint(("Montserrat", 0)) is None
+    assert main._get_font_size_hint(("Montserrat", 4)) == 14